@@ -17,165 +17,48 @@
 
 # Lets start by installing the required libraries running the following sentence:
 
-# pip install requests pandas
+# pip install requests pandas pyarrow
 
 # Now, we need to import some essential Libaries! Please run the following cell:
 
 import os
-import requests
-import zipfile
-from io import BytesIO
-from datetime import datetime
-import csv
 import pandas as pd
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from feed_catalog import full_year
+from feed_set import FeedSet
 
-# We are ready for the environment for this question now. Let's get the basic datasets for this question. By running the following cell, it will automatically download the datasets for "trips" datasets for 2019-2024.
-# Note: If new datasets are uploaded to the Base url, you just need to change the numbers in YEARS = range(2019, 2025). It will download the newest datasets for you.
+# We are ready for the environment for this question now. Let's get the basic datasets for this question. Calling main() will load the "trips" table of every season for 2019-2024 from the local feed store.
+# Note: Seasons that are not in the store yet are downloaded from the MBTA archive and converted once. If new datasets are uploaded, you just need to change the numbers in YEARS = range(2019, 2025).
+# Note: Seasons are the ones in each archive's feed_version name in the MBTA catalog, like for the other questions.
 
 # +
-# Download dataset from MBTA archived feeds.
-BASE_URL = "https://cdn.mbta.com/archive/archived_feeds.txt"
-DOWNLOAD_DIR = "mbta_datasets"
-YEARS = range(2019, 2025)  # Range of years to download
-SEASONS = ["winter", "spring", "summer", "fall"]  # MBTA seasons
-TRIPS_FILENAME = "trips.txt"  # Name of the dataset file in the zip
+# Load the trips tables from the local Parquet feed store.
+YEARS = range(2019, 2025)  # Range of years to load
+SEASONS = ["Winter", "Spring", "Summer", "Fall"]  # MBTA seasons
 
-# Create download directory if it doesn't exist
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+# tables are loaded from the feed store the first time they are used
+feeds = FeedSet(YEARS, SEASONS, ["trips"])
 
-def fetch_data_urls(base_url):
+def load_trips(years, seasons, feeds=feeds):
     """
-    Fetches the dataset URLs from the archive file.
-    Returns a dictionary of the newest URLs for each season.
+    Reads the trips table of every season into a single DataFrame with year and season columns.
+    Seasons are the ones of the feed_version names in the catalog, not of the feed_start_date month.
     """
-    response = requests.get(base_url)
-    response.raise_for_status()
-    lines = response.text.splitlines()
-
-    # Parse the file as CSV since it contains structured metadata
-    reader = csv.reader(lines)
-    header = next(reader)  # Skip header
-    url_index = header.index("archive_url")  # Find the column with the URLs
-    date_index = header.index("feed_start_date")  # Find the column with the start date
-
-    dataset_records = []
-    for row in reader:
-        if len(row) > url_index and row[url_index].startswith("http"):
-            dataset_records.append({
-                "url": row[url_index],
-                "date": row[date_index],
-                "season": get_season_from_date(row[date_index])
-            })
-
-    # Filter datasets for the desired years and seasons
-    newest_urls = {}
-    for year in YEARS:
-        for season in SEASONS:
-            season_records = [
-                record for record in dataset_records 
-                if record["season"] == season and record["date"].startswith(str(year))
-            ]
-            if season_records:
-                # Sort by date to get the newest file
-                season_records.sort(key=lambda x: x["date"], reverse=True)
-                newest_urls[f"{year}_{season}"] = season_records[0]["url"]
-    
-    return newest_urls
-
-def get_season_from_date(date_str):
-    """
-    Determines the season based on the date.
-    """
-    date_obj = datetime.strptime(date_str, "%Y%m%d")
-    if date_obj.month in [12, 1, 2]:
-        return "winter"
-    elif date_obj.month in [3, 4, 5]:
-        return "spring"
-    elif date_obj.month in [6, 7, 8]:
-        return "summer"
-    else:
-        return "fall"
-
-def download_and_extract(url, season_year):
-    """
-    Downloads and extracts the trips dataset from a zip file URL and renames it.
-    """
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        with zipfile.ZipFile(BytesIO(response.content)) as z:
-            # List all files in the archive
-            file_list = z.namelist()
-            # Find the file named exactly "trips.txt"
-            if TRIPS_FILENAME in file_list:
-                print(f"Extracting {TRIPS_FILENAME} from {url}...")
-                # Define the renamed file path
-                renamed_file_path = os.path.join(DOWNLOAD_DIR, f"{season_year}_trips.txt")
-                # Extract and rename the file
-                with z.open(TRIPS_FILENAME) as original_file, open(renamed_file_path, "wb") as renamed_file:
-                    renamed_file.write(original_file.read())
-                print(f"Saved as {renamed_file_path}.")
-            else:
-                print(f"'{TRIPS_FILENAME}' not found in {url}")
-    except Exception as e:
-        print(f"Failed to download or extract from {url}: {e}")
-
-# def main():
-print(f"Fetching dataset URLs from {BASE_URL}...")
-newest_data_urls = fetch_data_urls(BASE_URL)
-
-print(f"Found {len(newest_data_urls)} datasets (newest for each season).")
-for season_year, url in newest_data_urls.items():
-    # Download and extract each dataset with a renamed file
-    download_and_extract(url, season_year)
-
-# if __name__ == "__main__":
-#     main()
-# -
-
-# Finally we have everthing ready for our data analysis! Now we can start the data cleaning process for these datasets. Let's filter out the commuter rail data and doing some data cleaning process.
-# First, running the following cell will merge all downloaded datasets into a CSV file that only contains Commuter rail data with years and seasons.
-# We will use this merged CSV file to make further analysis.
-
-# +
-# Directory containing the downloaded files
-RAW_DATA_DIR = "mbta_datasets"
-MERGED_FILE = "merged_trips.csv"
-FILTERED_FILE = "filtered_commuter_rail_trips.csv"
-
-def merge_all_datasets(raw_dir, merged_file):
-    """
-    Merges all trips datasets into a single CSV file.
-
-    """
-    files = [f for f in os.listdir(raw_dir) if f.endswith("_trips.txt")]
-
-    if not files:
-        print("No files found in the directory.")
-        return pd.DataFrame()
-
-    merged_df = pd.DataFrame()
-
-    for file in files:
-        file_path = os.path.join(raw_dir, file)
-        print(f"Reading {file_path}...")
-        df = pd.read_csv(file_path, low_memory=False)
-        # Add year and season based on the file name
-        parts = file.split("_")
-        year = parts[0]
-        season = parts[1].replace("trips.txt", "").strip()
-        df["year"] = year
-        df["season"] = season
-        merged_df = pd.concat([merged_df, df], ignore_index=True)
-
-    # Save the merged dataset
-    merged_df.to_csv(merged_file, index=False)
-    print(f"Merged dataset saved to {merged_file}.")
-    return merged_df
-
-def filter_commuter_rail_data(merged_df, filtered_file):
+    print("Loading trips from the feed store...")
+    parts = []
+    for year in years:
+        for season in seasons:
+            trips = feeds.get(year, season, "trips")
+            if trips is not None:
+                parts.append(trips.assign(year=full_year(year), season=season))
+    if not parts:
+        return pd.DataFrame(columns=["year", "season"])
+    return pd.concat(parts, ignore_index=True)
+
+def filter_commuter_rail_data(merged_df, filtered_file=None):
     """
-    Filters rows where `route_id` contains 'CR' and saves the result.
+    Filters rows where `route_id` contains 'CR', optionally saving the result.
 
     """
     if "route_id" not in merged_df.columns:
@@ -186,45 +69,29 @@ def filter_commuter_rail_data(merged_df, filtered_file):
     filtered_df = merged_df[merged_df["route_id"].str.contains("CR", na=False, case=False)]
 
     # Save the filtered dataset
-    filtered_df.to_csv(filtered_file, index=False)
-    print(f"Filtered dataset saved to {filtered_file}.")
+    if filtered_file is not None:
+        filtered_df.to_csv(filtered_file, index=False)
+        print(f"Filtered dataset saved to {filtered_file}.")
     return filtered_df
 
-print("Merging all datasets...")
-merged_df = merge_all_datasets(RAW_DATA_DIR, MERGED_FILE)
-
-if not merged_df.empty:
-    print("Filtering commuter rail data...")
-    filter_commuter_rail_data(merged_df, FILTERED_FILE)
-else:
-    print("No data to filter.")
-
 
 # -
 
-# Now the following cell will process the data cleanning process and create a new cleaned CSV. This is the final step for us to make further analysis!
+# Now the following cell will process the data cleanning process. This is the final step for us to make further analysis!
 
 # +
-# Path to the filtered commuter rail dataset
-FILTERED_FILE = "filtered_commuter_rail_trips.csv"
-CLEANED_FILE = "cleaned_commuter_rail_trips.csv"
-
-def clean_dataset(file_path, output_file):
+def clean_dataset(df, output_file=None):
     """
     Cleans the filtered commuter rail dataset with multiple cleaning steps.
     
     Args:
-        file_path (str): Path to the filtered dataset.
-        output_file (str): Path to save the cleaned dataset.
+        df (pd.DataFrame): The filtered dataset.
+        output_file (str): Optional path to save the cleaned dataset as CSV.
     
     Returns:
         pd.DataFrame: The cleaned DataFrame.
     """
     try:
-        # Load the dataset
-        print(f"Loading dataset from {file_path}...")
-        df = pd.read_csv(file_path, low_memory=False)
-
         print(f"Initial dataset shape: {df.shape}")
 
         # 1. Remove duplicates
@@ -277,17 +144,30 @@ def clean_dataset(file_path, output_file):
         print(f"Final dataset shape: {df.shape}")
 
         # Save the cleaned dataset
-        df.to_csv(output_file, index=False)
-        print(f"Cleaned dataset saved to {output_file}.")
+        if output_file is not None:
+            df.to_csv(output_file, index=False)
+            print(f"Cleaned dataset saved to {output_file}.")
         return df
 
     except Exception as e:
         print(f"Error during data cleaning: {e}")
         return None
 
-def main():
+def main(years=YEARS, seasons=SEASONS, feeds=feeds):
+    """
+    Loads, filters and cleans the trips of the given years and seasons.
+    """
+    merged_df = load_trips(years, seasons, feeds)
+
+    if not merged_df.empty:
+        print("Filtering commuter rail data...")
+        filtered_df = filter_commuter_rail_data(merged_df)
+    else:
+        print("No data to filter.")
+        filtered_df = merged_df
+
     print("Starting data cleaning process...")
-    cleaned_df = clean_dataset(FILTERED_FILE, CLEANED_FILE)
+    cleaned_df = clean_dataset(filtered_df)
     # if cleaned_df is not None:
     #     print("Data cleaning process completed successfully.")
     # else:
@@ -295,41 +175,46 @@ def main():
     return cleaned_df
 
 
-cleaned_df = main()
-
-import matplotlib.pyplot as plt
+def get_net_trains_per_line(cleaned_df):
+    """
+    Counts the unique trains (trip_id) of each line, largest first.
+    """
+    # Group by route_id (line) and count unique trip_id (trains)
+    net_trains_per_line = cleaned_df.groupby("route_id")["trip_id"].nunique().reset_index()
+    net_trains_per_line.columns = ["route_id", "net_trains"]
 
-# Load the cleaned dataset
-file_path = "cleaned_commuter_rail_trips.csv"  # Adjust path if necessary
-# df = pd.read_csv(file_path)
+    # Sort by the number of trains for better visualization
+    net_trains_per_line = net_trains_per_line.sort_values(by="net_trains", ascending=False)
+    return net_trains_per_line
 
-# Group by route_id (line) and count unique trip_id (trains)
-net_trains_per_line = cleaned_df.groupby("route_id")["trip_id"].nunique().reset_index()
-net_trains_per_line.columns = ["route_id", "net_trains"]
 
-# Sort by the number of trains for better visualization
-net_trains_per_line = net_trains_per_line.sort_values(by="net_trains", ascending=False)
+def plot_net_trains(net_trains_per_line):
+    """
+    Returns a bar chart of the net number of trains per line.
+    """
+    import matplotlib.pyplot as plt
 
-# Visualization
-fig_net_trains, ax = plt.subplots(figsize=(12, 8))
+    # Visualization
+    fig_net_trains, ax = plt.subplots(figsize=(12, 8))
 
-# Plot the bar chart
-bars = ax.bar(net_trains_per_line["route_id"], net_trains_per_line["net_trains"], color='skyblue')
+    # Plot the bar chart
+    bars = ax.bar(net_trains_per_line["route_id"], net_trains_per_line["net_trains"], color='skyblue')
 
-# Add numbers on the bars
-for bar in bars:
-    yval = bar.get_height()
-    ax.text(bar.get_x() + bar.get_width() / 2, yval + 2, int(yval), ha="center", va="bottom")
+    # Add numbers on the bars
+    for bar in bars:
+        yval = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width() / 2, yval + 2, int(yval), ha="center", va="bottom")
 
-# Chart aesthetics
-ax.set_title("Net Number of Trains Operating per Line", fontsize=16)
-ax.set_xlabel("Route ID (Line)", fontsize=12)
-ax.set_ylabel("Net Trains", fontsize=12)
-ax.set_xticks(range(len(net_trains_per_line["route_id"])))
-ax.set_xticklabels(net_trains_per_line["route_id"], rotation=45, ha="right")
+    # Chart aesthetics
+    ax.set_title("Net Number of Trains Operating per Line", fontsize=16)
+    ax.set_xlabel("Route ID (Line)", fontsize=12)
+    ax.set_ylabel("Net Trains", fontsize=12)
+    ax.set_xticks(range(len(net_trains_per_line["route_id"])))
+    ax.set_xticklabels(net_trains_per_line["route_id"], rotation=45, ha="right")
 
-# Adjust layout
-fig_net_trains.tight_layout()
+    # Adjust layout
+    fig_net_trains.tight_layout()
+    return fig_net_trains
 
 # # Save the result to a CSV file
 # output_file = "net_trains_per_line.csv"
@@ -421,15 +306,13 @@ fig_net_trains.tight_layout()
 #     plot_seasonal_data(df, season)
 
 # # +
-# Load the cleaned dataset
-file_path = "cleaned_commuter_rail_trips.csv"  # Adjust path if necessary
-df = pd.read_csv(file_path)
-
-# Define the seasons
-seasons = ["Spring", "Summer", "Fall", "Winter"]
+# # Use the cleaned dataset
+# df = main()
 
 # # Function to create a seasonal bar plot
 def plot_seasonal_analysis(data, season):
+    import matplotlib.pyplot as plt
+
     # Filter data for the given season
     seasonal_data = data[data["season"].str.upper() == season.upper()]
 
@@ -457,8 +340,13 @@ def plot_seasonal_analysis(data, season):
     plt.show()
 
 # # Generate plots for each season
-# for season in seasons:
+# for season in SEASONS:
 #     plot_seasonal_analysis(df, season)
 # -
 
 
+if __name__ == "__main__":
+    net_trains_per_line = get_net_trains_per_line(main())
+    print(net_trains_per_line)
+
+
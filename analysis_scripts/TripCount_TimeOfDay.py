@@ -1,155 +1,57 @@
 # This is the python file for Trip number by time of day
 
-# First table: The function trip_count_by_year(years, seasons, stop_times_data, trips_data, weekday_services) returns a dataframe
+# First table: The function trip_count_by_year(years, seasons, weekday_services) returns a dataframe
 #   a data frame trip_count, which contains the number of trip by time of day of each line
 
 # Second table: The function get_tripcount_weekday(years) will return a trip_count that contains the number of trips 
 #   in different time period by weekday
 
+# Histogram: The function get_trip_histogram(years, bin_minutes) returns a CountArray with the number of trip departures
+#   per feed, route, day type and N-minute bin of the service day
+
 
-import requests
-from bs4 import BeautifulSoup
-from io import BytesIO
-from io import StringIO
-import re
-import zipfile
 import pandas as pd
 import os
-import matplotlib.pyplot as plt
+import numpy as np
 import sys
-import seaborn as sns
-# parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-# sys.path.append(parent_dir)
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(parent_dir)
+import gtfs_time
+from feed_catalog import full_year
+from feed_set import FeedSet
 # import bigquery_cleaned_pipeline as bcp
 
-url = "https://cdn.mbta.com/archive/archived_feeds.txt"
-response = requests.get(url)
-soup = BeautifulSoup(response.content, 'html.parser')
-
-def get_db():
-    data = pd.read_csv(StringIO(soup.get_text()))
-    data['season'] = data['feed_version'].apply(
-        lambda x: re.search(r'(Fall|Spring|Summer|Winter)', x).group(0) if re.search(r'(Fall|Spring|Summer|Winter)', x) else None
-    )
-    data['year'] = data['feed_version'].apply(
-        lambda x: re.search(r'\b(20\d{2})\b', x).group(0) if re.search(r'\b(20\d{2})\b', x) else None
-    )
-    return data
-
-def extract_table_data(zip_url, table_names, season, year):
-    response = requests.get(zip_url)
-    zip_file = zipfile.ZipFile(BytesIO(response.content))
-    # tables = {}
-    for file_info in zip_file.infolist():
-        if str(file_info.filename).split('.')[0] == table_names:
-            with zip_file.open(file_info.filename) as file:
-                df = pd.read_csv(file)
-                table = df
-    return table
-
 years = [19, 20, 21, 22, 23, 24]
 seasons = ['Spring', 'Summer', 'Fall', 'Winter']
-lines_data = {}
-routes_data = {}
-trips_data = {}
-calendar_data = {}
-stop_times_data = {}
 
 table_names = ['lines', 'routes', 'trips', 'calendar', 'stop_times']
-table_args = {}
-db = get_db()
+# (label, start hour) of the time-of-day periods, see gtfs_time.SERVICE_PERIODS
+periods = gtfs_time.SERVICE_PERIODS
 
-for year in years:
-    for season in seasons:
-        for table in table_names:
-            filtered_data = db[(db['season'] == season) & (db['year'] == f'20{year}')]
-            if not filtered_data.empty:
-                try:
-                    zip_url = filtered_data.iloc[0]['archive_url']
-                    table_args[f'{table}_{year}{season}'] = (extract_table_data(zip_url, table, season, year))
-                except Exception as e:
-                    print(f'Table {table} not found for {season} {year}')
-                    continue
-
-#Read the data
-for year in years:
-    for season in seasons:
-        try:
-        # file_path = f'/Users/lto/Desktop/MBTA_19-24/{year}{season}/lines.txt'
-        # lines_data[f'lines_{year}{season}'] = pd.read_csv(file_path, delimiter=',')
-            lines_data[f'lines_{year}{season}'] = table_args[f'lines_{year}{season}'].drop(columns=['line_desc', 'line_url', 'line_short_name'], errors='ignore')
-            globals()[f'lines_{year}{season}'] = lines_data[f'lines_{year}{season}']
-        # file_path = f'/Users/lto/Desktop/MBTA_19-24/{year}{season}/routes.txt'
-        # routes_data[f'routes_{year}{season}'] = pd.read_csv(file_path, delimiter=',')
-            routes_data[f'routes_{year}{season}'] = table_args[f'routes_{year}{season}']
-            globals()[f'routes_{year}{season}'] = table_args[f'routes_{year}{season}']
-            
-            # file_path = f'/Users/lto/Desktop/MBTA_19-24/{year}{season}/trips.txt'
-            # trips_data[f'trips_{year}{season}'] = pd.read_csv(file_path, delimiter=',')
-            trips_data[f'trips_{year}{season}'] = table_args[f'trips_{year}{season}']
-            globals()[f'trips_{year}{season}'] = table_args[f'trips_{year}{season}']
-            
-            # file_path = f'/Users/lto/Desktop/MBTA_19-24/{year}{season}/calendar.txt'
-            # calendar_data[f'calendar_{year}{season}'] = pd.read_csv(file_path, delimiter=',')
-            calendar_data[f'calendar_{year}{season}'] = table_args[f'calendar_{year}{season}']
-            globals()[f'calendar_{year}{season}'] = table_args[f'calendar_{year}{season}']
-            
-            # file_path = f'/Users/lto/Desktop/MBTA_19-24/{year}{season}/stop_times.txt'
-            # stop_times_data[f'stop_times_{year}{season}'] = pd.read_csv(file_path, delimiter=',')
-            stop_times_data[f'stop_times_{year}{season}'] = table_args[f'stop_times_{year}{season}']
-            globals()[f'stop_times_{year}{season}'] = table_args[f'stop_times_{year}{season}']
-        except Exception as e:
-            continue
-        
-        
-trip_counts = pd.DataFrame()
 
-def time_of_day(time_str):
-    hour = int(time_str.split(':')[0]) 
-    
-    if 3 <= hour < 6:
-        return 'Sunrise'
-    elif 6 <= hour < 7:
-        return 'Early AM'
-    elif 7 <= hour < 9:
-        return 'AM Peak'
-    elif 9 <= hour < 13.5:
-        return 'Midday Base'
-    elif 13.5 <= hour < 16:
-        return 'Midday School'
-    elif 16 <= hour < 18.5:
-        return 'PM Peak'
-    elif 18.5 <= hour < 22:
-        return 'Evening'
-    elif 22 <= hour < 24:
-        return 'Late Evening'
-    else:
-        return 'Night'
- 
-def fix_arrival_time(time_str):
-    try:
-        hours, minutes, seconds = map(int, time_str.split(":"))
-        if hours >= 24:
-            hours -= 24
-            return f"{hours:02}:{minutes:02}:{seconds:02}"
-        return time_str
-    except ValueError:
-        return None
-
-for season in seasons:
-    stop_times = stop_times_data.get(f'stop_times_24{season}')
-    if stop_times is not None:
-        stop_times['arrival_time'] = stop_times['arrival_time'].apply(fix_arrival_time)
-  
-
-def get_weekday_services(years, seasons, calendar_data):
+def prepare_lines(lines):
+    return lines.drop(columns=['line_desc', 'line_url', 'line_short_name'], errors='ignore')
+
+
+def prepare_stop_times(stop_times):
+    # parse stop times and bin the arrivals into time periods once per feed,
+    # dropping stops without a valid time
+    stop_times = gtfs_time.parse_time_columns(stop_times, ['arrival_time', 'departure_time'])
+    stop_times['time_period'] = gtfs_time.time_periods(stop_times['arrival_seconds'], periods)
+    return stop_times
+
+
+# tables are loaded from the feed store the first time they are used
+feeds = FeedSet(years, seasons, table_names, prepare={'lines': prepare_lines, 'stop_times': prepare_stop_times})
+
+
+def get_weekday_services(years, seasons, feeds=feeds):
     weekday_services = set()
     for year in years:
         for season in seasons:
-            calendar_key = f'calendar_{year}{season}'
+            calendar_df = feeds.get(year, season, 'calendar')
     
-            if calendar_data is not None and calendar_key in calendar_data:
-                calendar_df = calendar_data[calendar_key]
+            if calendar_df is not None:
                 weekdays = calendar_df[(calendar_df['monday'] == 1) |
                                     (calendar_df['tuesday'] == 1) |
                                     (calendar_df['wednesday'] == 1) |
@@ -159,28 +61,24 @@ def get_weekday_services(years, seasons, calendar_data):
                                     (calendar_df['friday'] == 1)]
                 weekday_services.update(weekdays['service_id'].unique())
             else:
-                print(f'No calendar data for {year}{season} or calendar_data is None')
+                print(f'No calendar data for {year}{season}')
                 
     return weekday_services
 
-def trip_count_by_year(years, seasons, stop_times_data, trips_data, weekday_services):
+def trip_count_by_year(years, seasons, weekday_services, feeds=feeds):
     trip_counts = pd.DataFrame()
     for year in years:
         for season in seasons:
-            stop_times_key = f'stop_times_{year}{season}'
-            trips_key = f'trips_{year}{season}'
-            if stop_times_key in stop_times_data and trips_key in trips_data:
-                stop_times = stop_times_data[stop_times_key]
-                trips = trips_data[trips_key]
-
-                stop_times['time_period'] = stop_times['arrival_time'].apply(time_of_day)
+            stop_times = feeds.get(year, season, 'stop_times')
+            trips = feeds.get(year, season, 'trips')
+            if stop_times is not None and trips is not None:
                 merged_data = stop_times.merge(trips[['trip_id', 'route_id', 'block_id', 'service_id']], on='trip_id')
                 
                 # keep only weekday
                 merged_data = merged_data[merged_data['service_id'].isin(weekday_services)]
 
                 # count number of trips 
-                grouped = merged_data.groupby(['time_period', 'route_id']).size().reset_index(name='Trip Count')
+                grouped = merged_data.groupby(['time_period', 'route_id'], observed=True).size().reset_index(name='Trip Count')
 
                 # add year and season
                 grouped['Year'] = year
@@ -188,138 +86,188 @@ def trip_count_by_year(years, seasons, stop_times_data, trips_data, weekday_serv
                 
                 trip_counts = pd.concat([trip_counts, grouped], ignore_index=True)
             else:
-                print(f'No data for {stop_times_key} or {trips_key}')
+                print(f'No data for stop_times or trips of {year}{season}')
 
     return trip_counts
 
 # Q2: Number of trip in time of day by weekday and weekend
 #
 # Merge Trip and Calendar
-tripcalendar_data = {}
-for year in years:
-    try:
-        trips_df = pd.concat([trips_data[f'trips_{year}{season}'] for season in seasons], ignore_index=True)
-        calendar_df = pd.concat([calendar_data[f'calendar_{year}{season}'] for season in seasons], ignore_index=True)
-        
-        tripcalendar_data[f'tripcalendar_{year}'] = pd.merge(trips_df, calendar_df, on='service_id', how='left')
-
-        globals()[f'tripcalendar_{year}'] = tripcalendar_data[f'tripcalendar_{year}']
-    except Exception as e:
-        continue
-
-tripcalendar_data = {}
-for year in years:
-    try:
-        trips_df = pd.concat([trips_data[f'trips_{year}{season}'] for season in seasons], ignore_index=True)
-        calendar_df = pd.concat([calendar_data[f'calendar_{year}{season}'] for season in seasons], ignore_index=True)
-        
-        tripcalendar_data[f'tripcalendar_{year}'] = pd.merge(trips_df, calendar_df, on='service_id', how='left')
-
-        globals()[f'tripcalendar_{year}'] = tripcalendar_data[f'tripcalendar_{year}']
-    except Exception as e:
-        continue
-
-def get_mergeddata(year):
+def get_tripcalendar(year, feeds=feeds):
+    trips_df = pd.concat([feeds[year, season, 'trips'] for season in seasons], ignore_index=True)
+    calendar_df = pd.concat([feeds[year, season, 'calendar'] for season in seasons], ignore_index=True)
+    return pd.merge(trips_df, calendar_df, on='service_id', how='left')
+
+def get_mergeddata(year, feeds=feeds):
+    # stop times with their trips and calendar, for every season of the year
+    trip_calendar_stoptime_data = []
     for season in seasons:
-        stop_times = stop_times_data.get(f'stop_times_{year}{season}')
+        stop_times = feeds.get(year, season, 'stop_times')
         if stop_times is not None:
-            stop_times['time_period'] = stop_times['arrival_time'].apply(time_of_day)
-            
-            trips = trips_data.get(f'trips_{year}{season}')
+            trips = feeds.get(year, season, 'trips')
             if trips is not None:
                 merged_data = stop_times.merge(trips[['trip_id', 'service_id', 'route_id', 'block_id']], on='trip_id')
                 
-                calendar = calendar_data.get(f'calendar_{year}{season}')
+                calendar = feeds.get(year, season, 'calendar')
                 if calendar is not None:
-                    trip_calendar_stoptime_data = merged_data.merge(
+                    trip_calendar_stoptime_data.append(merged_data.merge(
                         calendar[['service_id', 'monday', 'tuesday', 
                                   'start_date', 'end_date',
                                   'wednesday', 'thursday', 'friday', 'saturday', 'sunday']],
                         on='service_id',  
                         how='left'  
-                    )
+                    ))
                     
-    return trip_calendar_stoptime_data
-
-
-
-def get_tripcount_weekday(years):
-    l = []
-    for year in years: 
-        try:
-            merged = get_mergeddata(year)
-            l.append(merged)
-        except Exception as e:
-            continue
-    columns_to_drop = ['arrival_time', 'departure_time', 'stop_sequence', 
-                    'checkpoint_id', 
-                    'stop_headsign', 'pickup_type', 'drop_off_type']
-    all_merged_data = []
-    for i in l:
-        i['time_period'] = i['arrival_time'].apply(time_of_day)
-        i= i.drop(columns=columns_to_drop)
-        all_merged_data.append(i)
-    final_data = pd.concat(all_merged_data, ignore_index=True)
-    final_data['start_date'] = pd.to_datetime(final_data['start_date'], format='%Y%m%d')
-    final_data['end_date'] = pd.to_datetime(final_data['end_date'], format='%Y%m%d')
+    return pd.concat(trip_calendar_stoptime_data, ignore_index=True) if trip_calendar_stoptime_data else pd.DataFrame()
 
 
-        
-    # Define lists for weekdays, weekends, and commuter rail lines
-    inweekdays = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-    weekend = ['Saturday', 'Sunday']
-    lines = [
-        'CR-Fairmount', 'CR-Fitchburg', 'CR-Franklin','CR-Greenbush',
-        'CR-Worcester',  'CR-Haverhill', 
-        'CR-Kingston', 'CR-Lowell', 'CR-Middleborough', 
-        'CR-Needham','CR-Newburyport','CR-Providence', 
-        
-    ]
-    # Convert date columns to datetime if not already done
-    final_data['start_date'] = pd.to_datetime(final_data['start_date'], format='%Y%m%d')
-    final_data['end_date'] = pd.to_datetime(final_data['end_date'], format='%Y%m%d')
 
-    # Initialize a dictionary to store results
-    trip_counts = {}
+def get_tripcount_weekday(years, feeds=feeds):
+    """
+    Returns the trip counts of every commuter rail line per year and day of the week (rows)
+    and time period (columns), read straight from the count cube.
+    """
+    cube = get_tripcount_cube(years, feeds=feeds)
+    counts = cube.counts.transpose(0, 3, 1, 2).reshape(-1, len(cube.axes['time_period']))
+    index = pd.MultiIndex.from_product([cube.axes['line'], cube.axes['year'], cube.axes['day']],
+                                       names=['Line', 'Year', 'Day'])
+    return pd.DataFrame(counts, index=index, columns=cube.axes['time_period'])
 
-    # Iterate through each line
-    for line in lines:
-        # Filter for the current line
-        line_data = final_data[final_data['route_id'] == line]
-        
-        # Initialize a dictionary for each line to hold trip counts by day and time period
-        trip_counts[line] = {}
-        
-        # Loop through weekdays and weekend days
-        for day in inweekdays + weekend:
-            # Filter trips that operate on the specific day
-            day_data = line_data[line_data[day.lower()] == 1]
-            
-            # Group by time period and count trips
-            trip_count_by_time_period = day_data.groupby('time_period')['trip_id'].count()
-            
-            # Store the result in the dictionary
-            trip_counts[line][day] = trip_count_by_time_period.to_dict()
-
-    # Convert to DataFrame if needed
-    trip_counts_df = pd.DataFrame.from_dict({(i,j): trip_counts[i][j] 
-                            for i in trip_counts.keys() 
-                            for j in trip_counts[i].keys()},
-                        orient='index')
-    trip_counts_df.index.names = ['Line', 'Day']
-    trip_counts_df.fillna(0, inplace=True) # Fill NaNs with 0 if any periods have no trips
-    return trip_counts_df
+
+# Days of the week, as named in the calendar table
+days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# Calendar flags that make up each day type
+day_types = {
+    'Weekday': days[:5],
+    'Saturday': ['saturday'],
+    'Sunday': ['sunday'],
+}
+
+
+class CountArray:
+    """
+    Dense integer counts with the labels of each axis, in array order.
+    """
+
+    def __init__(self, counts, axes):
+        self.counts = counts
+        self.axes = axes
+
+    def to_frame(self, name='Trip Count'):
+        index = pd.MultiIndex.from_product(list(self.axes.values()), names=list(self.axes))
+        return pd.DataFrame({name: self.counts.ravel()}, index=index)
+
+
+def get_tripcount_cube(years, route_prefix='CR-', feeds=feeds):
+    """
+    Counts the trips (stop events) of every commuter rail line per day of the week, time period
+    and year, over all the seasons of each year. Returns a CountArray with the axes line, day,
+    time_period and year.
+    """
+    service_counts = []
+    for year in years:
+        for season in seasons:
+            stop_times = feeds.get(year, season, 'stop_times')
+            trips = feeds.get(year, season, 'trips')
+            calendar = feeds.get(year, season, 'calendar')
+            if stop_times is None or trips is None or calendar is None:
+                continue
+            trips = trips[trips['route_id'].astype(str).str.startswith(route_prefix)]
+            merged_data = stop_times[['trip_id', 'time_period']].merge(trips[['trip_id', 'route_id', 'service_id']], on='trip_id')
+
+            # reduce to one row per service before spreading over the days it runs
+            counts = merged_data.groupby(['route_id', 'service_id', 'time_period'], observed=True).size().reset_index(name='count')
+            counts = counts.merge(calendar[['service_id'] + days], on='service_id')
+            counts['route_id'] = counts['route_id'].astype(str)
+            counts['year'] = full_year(year)
+            service_counts.append(counts.drop(columns='service_id'))
+
+    period_labels = list(dict.fromkeys(label for label, _ in periods))
+    year_labels = sorted({full_year(year) for year in years})
+    if service_counts:
+        by_day = pd.concat(service_counts, ignore_index=True).melt(
+            id_vars=['route_id', 'time_period', 'year', 'count'], value_vars=days, var_name='day', value_name='runs')
+        by_day = by_day[by_day['runs'] == 1]
+    else:
+        by_day = pd.DataFrame({'route_id': [], 'time_period': [], 'year': [], 'count': [], 'day': []})
+
+    line_codes, lines = pd.factorize(by_day['route_id'], sort=True)
+    shape = (len(lines), len(days), len(period_labels), len(year_labels))
+    codes = (
+        line_codes,
+        pd.Categorical(by_day['day'], categories=days).codes,
+        pd.Categorical(by_day['time_period'], categories=period_labels).codes,
+        pd.Categorical(by_day['year'], categories=year_labels).codes,
+    )
+    flat = np.ravel_multi_index([np.asarray(code, dtype=np.intp) for code in codes], shape)
+    counts = np.bincount(flat, weights=by_day['count'], minlength=int(np.prod(shape)))
+    return CountArray(counts.astype(np.int64).reshape(shape), {
+        'line': list(lines),
+        'day': [day.capitalize() for day in days],
+        'time_period': period_labels,
+        'year': year_labels,
+    })
+
+
+def get_trip_histogram(years, bin_minutes=15, route_prefix='CR-', feeds=feeds):
+    """
+    Counts trip departures (the first departure of each trip) per feed, route,
+    day type and bin_minutes wide bin of the service day, times past 24:00
+    included. Returns a CountArray with the axes feed ((year, season)), route,
+    day_type and bin (minutes since service-day midnight at the start of the bin).
+    """
+    bin_seconds = bin_minutes * 60
+    feed_labels = []
+    departures = []
+    for year in years:
+        for season in seasons:
+            stop_times = feeds.get(year, season, 'stop_times')
+            trips = feeds.get(year, season, 'trips')
+            calendar = feeds.get(year, season, 'calendar')
+            if stop_times is None or trips is None or calendar is None:
+                continue
+            first_departures = stop_times.groupby('trip_id', sort=False)['departure_seconds'].min()
+            trips = trips[trips['route_id'].astype(str).str.startswith(route_prefix)]
+            trips = trips[['trip_id', 'route_id', 'service_id']].merge(calendar, on='service_id')
+            trips = trips.join(first_departures, on='trip_id', how='inner')
+
+            # one row per trip and day type it runs on
+            for day_type, days in day_types.items():
+                runs = trips[(trips[days] == 1).any(axis=1)]
+                departures.append(pd.DataFrame({
+                    'feed': len(feed_labels),
+                    'route_id': runs['route_id'].astype(str).to_numpy(),
+                    'day_type': list(day_types).index(day_type),
+                    'bin': runs['departure_seconds'].to_numpy() // bin_seconds,
+                }))
+            feed_labels.append((year, season))
+
+    departures = pd.concat(departures, ignore_index=True) if departures else \
+        pd.DataFrame({'feed': [], 'route_id': [], 'day_type': [], 'bin': []})
+    route_codes, routes = pd.factorize(departures['route_id'], sort=True)
+    n_bins = max(gtfs_time.DAY // bin_seconds, int(departures['bin'].max()) + 1 if len(departures) else 0)
+    shape = (len(feed_labels), len(routes), len(day_types), n_bins)
+
+    # a single bincount over the flattened (feed, route, day type, bin) index
+    flat = np.ravel_multi_index((departures['feed'].to_numpy(dtype=np.intp), route_codes,
+                                 departures['day_type'].to_numpy(dtype=np.intp),
+                                 departures['bin'].to_numpy(dtype=np.intp)), shape)
+    counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+    return CountArray(counts, {
+        'feed': feed_labels,
+        'route': list(routes),
+        'day_type': list(day_types),
+        'bin': list(np.arange(n_bins) * bin_minutes),
+    })
 
 def get_plot(trip_counts_df):
-    
-    lines = [
-        'CR-Fairmount', 'CR-Fitchburg', 'CR-Franklin', 'CR-Greenbush',
-        'CR-Worcester', 'CR-Haverhill',
-        'CR-Kingston', 'CR-Lowell', 'CR-Middleborough',
-        'CR-Needham', 'CR-Newburyport', 'CR-Providence'
-    ]
-    time_periods = ['AM Peak', 'Early AM', 'Evening', 'Late Evening', 'Midday Base', 
-                    'Midday School', 'Night', 'PM Peak', 'Sunrise']
+    # plotting libraries are only imported when a figure is drawn
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    lines = trip_counts_df.index.get_level_values('Line').unique()
+    time_periods = list(dict.fromkeys(label for label, _ in periods))
     years = [2019, 2020, 2021, 2022, 2023, 2024]
     colors = sns.color_palette("husl", len(years)) 
     
@@ -351,9 +299,7 @@ def get_plot(trip_counts_df):
         for j, year in enumerate(years):
             try:
                 weekend_data = trip_counts_df.loc[(line, year)]
-                weekend_data = trip_counts_df[
-                    trip_counts_df.index.get_level_values('Day').isin(['Saturday', 'Sunday'])
-                ]
+                weekend_data = weekend_data[weekend_data.index.isin(['Saturday', 'Sunday'])]
                 weekend_avg = weekend_data[time_periods].mean().values
                 axes[5].plot(time_periods, weekend_avg, marker='o', color=colors[j], label=year)
             except Exception as e:
@@ -1,7 +1,6 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns 
-import numpy as np 
 
 seasons = ['Spring', 'Summer', 'Fall', 'Winter']
 
@@ -49,7 +48,8 @@ def plot_heatmap(changed_stations):
 
     zone_pivot = df_melted.pivot(index='stop_name', columns='year', values='zone_id')
     zone_mapping = {zone: idx for idx, zone in enumerate(zone_pivot.stack().unique())}
-    zone_pivot_encoded = zone_pivot.replace(zone_mapping)
+    # replace keeps the object dtype under pandas 3, heatmap needs numbers
+    zone_pivot_encoded = zone_pivot.replace(zone_mapping).astype(int)
     color_palette = sns.color_palette("tab10", n_colors=len(zone_mapping))
     fig, ax = plt.subplots(figsize=(10, 6))
     sns.heatmap(zone_pivot_encoded, 
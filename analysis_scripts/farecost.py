@@ -10,9 +10,8 @@ def read_fares(fares_df, year, season):
     #             fares_data[f'fares_{season}{year}'] = pd.read_csv(file_path, delimiter=',')
     #             fares_data[f'fares_{season}{year}']['season'] = f'{season}'
     #             fares_data[f'fares_{season}{year}']['year'] = f'{year}'
-    fares_df['season'] = season
-    fares_df['year'] = year
-    return fares_df
+    # the products table may be shared with other analyses, so it is not modified
+    return fares_df.assign(season=season, year=year)
 
 # Function to read fare leg rules
 def read_fare_leg_rules(fares_rules_df):
@@ -28,13 +27,17 @@ def process_routes(routes_df):
 
 # Function to process and merge fare data
 def process_fares_and_routes(fares_data, fares_rules_data, routes_data):
-    combined_fares_df = pd.concat(fares_data.values(), ignore_index=True)
-    combined_fares_rules_df = pd.concat(fares_rules_data.values(), ignore_index=True)
-    combined_fares_rules_df = combined_fares_rules_df.drop(columns=['transfer_only', 'from_timeframe_group_id', 'to_timeframe_group_id'])
-
-    combined_fare_result = pd.merge(combined_fares_df, combined_fares_rules_df, on='fare_product_id', how='inner')
-    combined_fare_result = pd.merge(combined_fare_result, routes_data, on='network_id', how='left')
-    combined_fare_result = combined_fare_result.drop(columns=['agency_id', 'route_type', 'route_sort_order', 'route_color'])
+    # products are indexed by fare_product_id and routes by network_id, so the
+    # leg rules are joined against the indexes instead of merging wide frames
+    fares = pd.concat(fares_data.values(), ignore_index=True)
+    fares = fares.astype({'fare_product_id': str}).set_index('fare_product_id')[['amount', 'season', 'year']]
+    fares_rules = pd.concat(fares_rules_data.values(), ignore_index=True)
+    fares_rules = fares_rules.astype({'fare_product_id': str, 'network_id': str})
+    fares_rules = fares_rules[['network_id', 'from_area_id', 'to_area_id', 'fare_product_id']]
+    routes = routes_data.astype({'network_id': str, 'route_id': str, 'line_id': str}).set_index('network_id')[['route_id', 'line_id']]
+
+    combined_fare_result = fares_rules.join(fares, on='fare_product_id', how='inner')
+    combined_fare_result = combined_fare_result.join(routes, on='network_id', how='left')
 
     return combined_fare_result
 
@@ -42,39 +45,26 @@ def process_fares_and_routes(fares_data, fares_rules_data, routes_data):
 def filter_commuter_rail_data(combined_fare_result, to_area_id_mapping):
     combined_fare_result_CR = combined_fare_result[combined_fare_result['network_id'].isin(['commuter_rail', 'cape_flyer'])]
     combined_fare_result_CR_cash_1a = combined_fare_result_CR[combined_fare_result_CR['from_area_id'] == 'area_commuter_rail_zone_1a']
-    combined_fare_result_CR_cash_1a_drop = combined_fare_result_CR_cash_1a.drop_duplicates()
 
-    filtered_df = combined_fare_result_CR_cash_1a_drop[
-        combined_fare_result_CR_cash_1a_drop.apply(
-            lambda row: row['to_area_id'] == to_area_id_mapping.get(row['line_id'], row['to_area_id']),
-            axis=1
-        )
+    # keep the destination zone mapped to each line, and every zone for lines without a mapping
+    target_area_id = combined_fare_result_CR_cash_1a['line_id'].map(to_area_id_mapping)
+    filtered_df = combined_fare_result_CR_cash_1a[
+        target_area_id.isna() | (combined_fare_result_CR_cash_1a['to_area_id'] == target_area_id)
     ]
     return filtered_df
 
 # Function to merge and prepare the final table
-def prepare_final_table(filtered_df, combined_fare_result_CR_cash_1a_drop):
-    merged_df = filtered_df.merge(
-        combined_fare_result_CR_cash_1a_drop[['to_area_id', 'amount']],
-        on='to_area_id',
-        suffixes=('', '_new'),
-        how='left'
-    )
-    merged_df['amount'] = merged_df['amount_new'].combine_first(merged_df['amount'])
-    merged_df = merged_df.drop(columns=['amount_new']).drop_duplicates()
-    #print(merged_df[['route_id', 'amount']].drop_duplicates().sort_values(by='amount', ascending=False).head(10))
-    merged_df_ppt = merged_df[['route_id', 'amount']]
-    merged_df_ppt = merged_df_ppt.drop_duplicates()
-    merged_df_ppt = merged_df_ppt.sort_values(by='amount', ascending=False)
-    merged_df_ppt = merged_df_ppt.drop_duplicates(subset=['route_id'], keep='first')
-    merged_df_ppt = merged_df_ppt.reset_index(drop=True)
-    merged_df_ppt['amount'] = merged_df_ppt['amount'].apply(lambda x: f"${x:.2f}")
+def prepare_final_table(filtered_df):
+    # each route gets the highest fare of any of its destination zones
+    zone_amount = filtered_df.groupby('to_area_id')['amount'].max()
+    merged_df = filtered_df[['route_id']].assign(amount=filtered_df['to_area_id'].map(zone_amount))
+    merged_df_ppt = merged_df.groupby('route_id', dropna=False, sort=False)['amount'].max().reset_index()
+    merged_df_ppt = merged_df_ppt.sort_values(by='amount', ascending=False, kind='stable', ignore_index=True)
+    merged_df_ppt['amount'] = merged_df_ppt['amount'].map('${:.2f}'.format)
     return merged_df_ppt
 
 # Main function to execute the process
 def main(dataframes):
-    years = [2023, 2024]
-    seasons = ['Spring', 'Summer', 'Fall', 'Winter']
     # base_path = '/Users/bhuvan/Documents/VS code/DS701 project/Datasets'
     # skip_fares_file = f'{base_path}/Winter2024/fare_products.txt'
     # skip_rules_file = f'{base_path}/Winter2024/fare_leg_rules.txt'
@@ -99,13 +89,16 @@ def main(dataframes):
     fares_data = {}
     fares_rules_data = {}
     routes_df = dataframes['routes_2023_Spring']
-    for year in years:
-        for season in seasons:
-            try:
-                fares_data[f'fares_{season}{year}'] = read_fares(dataframes[f'fare_products_{year}_{season}'], year, season)
-                fares_rules_data[f'fares_rules_{season}{year}'] = read_fare_leg_rules(dataframes[f'fare_leg_rules_{year}_{season}'])
-            except Exception as e:
-                continue
+    # every feed that was passed in with GTFS-Fares v2 tables (2023 onward)
+    for key in dataframes:
+        if not key.startswith('fare_products_'):
+            continue
+        year, season = key[len('fare_products_'):].split('_')
+        try:
+            fares_data[f'fares_{season}{year}'] = read_fares(dataframes[f'fare_products_{year}_{season}'], year, season)
+            fares_rules_data[f'fares_rules_{season}{year}'] = read_fare_leg_rules(dataframes[f'fare_leg_rules_{year}_{season}'])
+        except Exception as e:
+            continue
     # fares_data = read_fares(years, seasons, base_path, skip_fares_file)
     # fares_rules_data = read_fare_leg_rules(years, seasons, base_path, skip_rules_file)
     routes_data = process_routes(routes_df)
@@ -113,7 +106,7 @@ def main(dataframes):
     combined_fare_result = process_fares_and_routes(fares_data, fares_rules_data, routes_data)
     filtered_df = filter_commuter_rail_data(combined_fare_result, to_area_id_mapping)
 
-    final_table = prepare_final_table(filtered_df, filtered_df)
+    final_table = prepare_final_table(filtered_df)
     return final_table
 
 ### todo: make changes to the function to accept the dataframes as arguments
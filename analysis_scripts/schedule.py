@@ -1,87 +1,56 @@
-import requests
-from bs4 import BeautifulSoup
-from io import BytesIO
-from io import StringIO
-import re
-import zipfile
 import pandas as pd
 import os
 import sys
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(parent_dir)
+import gtfs_time
+from feed_set import FeedSet
 # import bigquery_cleaned_pipeline as bcp
-import matplotlib.pyplot as plt
-import matplotlib.cm
 
+years = [2019, 2020, 2021, 2022, 2023, 2024]
+seasons = ["Spring", "Fall", "Summer", "Winter"]
 table_names = ['trips', 'calendar', 'stop_times', 'routes']
+# chronological order of the seasons within a year
+season_order = ["Fall", "Winter", "Spring", "Summer"]
 
-url = "https://cdn.mbta.com/archive/archived_feeds.txt"
-response = requests.get(url)
-soup = BeautifulSoup(response.content, 'html.parser')
+calendar_columns = ["service_id", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday", "start_date", "end_date"]
+stop_times_columns = ["trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"]
+trips_columns = ["route_id", "service_id", "trip_id", "direction_id"]
+routes_columns = ["route_id", "route_desc"]
+columns = {"calendar": calendar_columns, "stop_times": stop_times_columns, "trips": trips_columns, "routes": routes_columns}
+
+# tables are loaded from the feed store the first time they are used, only
+# with the needed columns
+feeds = FeedSet(years, seasons, table_names, columns=columns)
 
-def get_db():
-    data = pd.read_csv(StringIO(soup.get_text()))
-    data['season'] = data['feed_version'].apply(
-        lambda x: re.search(r'(Fall|Spring|Summer|Winter)', x).group(0) if re.search(r'(Fall|Spring|Summer|Winter)', x) else None
-    )
-    data['year'] = data['feed_version'].apply(
-        lambda x: re.search(r'\b(20\d{2})\b', x).group(0) if re.search(r'\b(20\d{2})\b', x) else None
-    )
-    return data
 
-def extract_table_data(zip_url, table_names, season, year):
-    response = requests.get(zip_url)
-    zip_file = zipfile.ZipFile(BytesIO(response.content))
-    # tables = {}
-    for file_info in zip_file.infolist():
-        if str(file_info.filename).split('.')[0] == table_names:
-            with zip_file.open(file_info.filename) as file:
-                df = pd.read_csv(file)
-                table = df
-    return table
+def select_columns(df, table_name):
+    # a shared FeedSet may hold more columns than this analysis reads
+    return df[[column for column in columns[table_name] if column in df.columns]]
 
-db = get_db()
 
 # Function to load and clean data
-def load_cleaned_data(base_dir, years, seasons):
-    calendar_columns = ["service_id", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday", "start_date", "end_date"]
-    stop_times_columns = ["trip_id", "arrival_time", "departure_time", "stop_id"]
-    trips_columns = ["route_id", "service_id", "trip_id", "direction_id"]
+def load_cleaned_data(base_dir, years, seasons, feeds=feeds):
     cleaned_data = {}
 
     for year in years:
         cleaned_data[year] = {}
         for season in seasons:
             cleaned_data[year][season] = {}
-            cleaned_data_temp = {}
             try:
-                for table in table_names:
-                    filtered_data = db[(db['season'] == season) & (db['year'] == str(year))]
-                    if not filtered_data.empty:
-                        zip_url = filtered_data.iloc[0]['archive_url']
-                        table_data = extract_table_data(zip_url, table, season, year)
-                        if table == "calendar":
-                            calendar_df = pd.DataFrame(table_data, columns=calendar_columns)
-                            calendar_df.dropna(inplace=True)
-                            cleaned_data_temp["calendar"] = calendar_df
-                        elif table == "stop_times":
-                            stop_times_df = pd.DataFrame(table_data, columns=stop_times_columns)
-                            stop_times_df.dropna(inplace=True)
-                            cleaned_data_temp["stop_times"] = stop_times_df
-                        elif table == "trips":
-                            trips_df = pd.DataFrame(table_data, columns=trips_columns)
-                            trips_df.dropna(inplace=True)
-                            cleaned_data_temp["trips"] = trips_df
-                        elif table == "routes":
-                            routes_df = pd.DataFrame(table_data)
-                            commuter_routes = routes_df[routes_df['route_desc'].str.contains("Commuter Rail", na=False)][['route_id', 'route_desc']]
-                            cleaned_data_temp["routes"] = commuter_routes
-            
+                tables = {table_name: select_columns(feeds[year, season, table_name], table_name) for table_name in table_names}
+                calendar_df = tables["calendar"].dropna()
+                stop_times_df = tables["stop_times"].dropna()
+                trips_df = tables["trips"].dropna()
+
+                routes_df = tables["routes"]
+                commuter_routes = routes_df[routes_df['route_desc'].str.contains("Commuter Rail", na=False)]
+
                 cleaned_data[year][season] = {
-                    "calendar": cleaned_data_temp["calendar"],
-                    "stop_times": cleaned_data_temp["stop_times"],
-                    "trips": cleaned_data_temp["trips"],
-                    "routes": cleaned_data_temp["routes"]
+                    "calendar": calendar_df,
+                    "stop_times": stop_times_df,
+                    "trips": trips_df,
+                    "routes": commuter_routes
                 }
             except Exception as e:
                 # print(f'error: {e}')
@@ -190,15 +159,8 @@ def calculate_average_departure_times(merged_data):
 
     for year in merged_data:
         for season in merged_data[year]:
-            season_df = merged_data[year][season].copy()
-            season_df['departure_datetime'] = pd.to_datetime(
-                season_df['departure_time'], format='%H:%M:%S', errors='coerce'
-            )
-            season_df = season_df.dropna(subset=['departure_datetime'])
-            season_df['minutes_past_midnight'] = (
-                season_df['departure_datetime'].dt.hour * 60 + season_df['departure_datetime'].dt.minute
-            )
-            avg_minutes = season_df['minutes_past_midnight'].mean()
+            departure_seconds, valid = gtfs_time.parse_times(merged_data[year][season]['departure_time'])
+            avg_minutes = (departure_seconds[valid] // 60).mean()
             average_departure_times.append({
                 'year': year,
                 'season': season,
@@ -219,34 +181,21 @@ def calculate_average_departure_times(merged_data):
 def clean_time_data(df):
     """
     Cleans the input DataFrame by ensuring valid time formats for arrival and departure times.
-    Rows with invalid times are removed.
+    Rows with invalid times are removed, and arrival_seconds / departure_seconds are added.
     """
-    def is_valid_time(time_str):
-        try:
-            pd.to_datetime(time_str, format='%H:%M:%S')
-            return True
-        except ValueError:
-            return False
-
-    valid_arrival = df['arrival_time'].apply(is_valid_time)
-    valid_departure = df['departure_time'].apply(is_valid_time)
-    return df[valid_arrival & valid_departure]
+    return gtfs_time.parse_time_columns(df, ['arrival_time', 'departure_time'])
 
 
 # --- Trip Duration Calculation ---
 def calculate_trip_durations(df):
     """
-    Calculates trip durations by grouping the data by route and trip IDs.
-    Returns a DataFrame with trip IDs, route IDs, and trip durations.
+    Calculates trip durations from the first departure to the last arrival of each trip, in stop_sequence order.
+    Returns a DataFrame with trip IDs, route IDs, trip durations, first departure and last arrival seconds and stop counts.
     """
     df = clean_time_data(df)
-    df['arrival_time'] = pd.to_datetime(df['arrival_time'], format='%H:%M:%S')
-    df['departure_time'] = pd.to_datetime(df['departure_time'], format='%H:%M:%S')
-
-    grouped = df.groupby(['route_id', 'trip_id']).apply(
-        lambda x: x['departure_time'].iloc[-1] - x['arrival_time'].iloc[0]
-    ).reset_index(name='trip_duration')
-    return grouped
+    extents = gtfs_time.trip_extents(df, carry=['route_id'])
+    extents['trip_duration'] = pd.to_timedelta(extents['duration'], unit='s')
+    return extents.drop(columns='duration')
 
 
 def calculate_average_trip_duration_per_route(trip_durations):
@@ -254,60 +203,47 @@ def calculate_average_trip_duration_per_route(trip_durations):
     Aggregates trip durations for each route and calculates the average trip duration.
     Returns a DataFrame with route IDs and their average trip durations.
     """
-    average_durations = trip_durations.groupby('route_id')['trip_duration'].mean().reset_index()
+    average_durations = trip_durations.groupby('route_id', observed=True)['trip_duration'].mean().reset_index()
     average_durations.rename(columns={'trip_duration': 'average_trip_duration'}, inplace=True)
     return average_durations
 
 
 # --- Data Aggregation ---
+def season_year_order(years):
+    """
+    Returns the season-year labels (e.g. "Fall2019") of the given years in chronological order.
+    """
+    return [f"{season}{year}" for year in sorted(years) for season in season_order]
+
+
 def aggregate_route_data(merged_data):
     """
     Processes merged data to calculate average trip durations for each route across all seasons and years.
-    Returns a dictionary of route DataFrames for each route ID.
+    Returns one long-format DataFrame with a row per route and season-year, season-year being an ordered categorical.
     """
-    route_data = {}
+    season_averages = []
 
     for year, seasons in merged_data.items():
         for season, df in seasons.items():
             trip_durations = calculate_trip_durations(df)
             average_trip_durations = calculate_average_trip_duration_per_route(trip_durations)
+            average_trip_durations['season-year'] = f"{season}{year}"
+            season_averages.append(average_trip_durations)
 
-            season_year = f"{season}{year}"
-            
-            for _, row in average_trip_durations.iterrows():
-                route_id = row['route_id']
-                avg_duration = row['average_trip_duration']
-
-                if route_id not in route_data:
-                    route_data[route_id] = []
-
-                route_data[route_id].append({
-                    'season-year': season_year,
-                    'average_trip_duration': avg_duration
-                })
-
-    route_dfs = {
-        route_id: pd.DataFrame(data).sort_values(by='season-year')
-        for route_id, data in route_data.items()
-    }
-    return route_dfs
+    route_data = pd.concat(season_averages, ignore_index=True)
+    route_data['route_id'] = route_data['route_id'].astype(str)
+    route_data['season-year'] = pd.Categorical(route_data['season-year'], categories=season_year_order(merged_data), ordered=True)
+    return route_data.sort_values(by=['route_id', 'season-year'], ignore_index=True)
 
 
-def combine_route_data(route_dfs):
+def combine_route_data(route_data):
     """
-    Combines route-specific data into a single DataFrame for easier analysis and visualization.
+    Prepares the route table for analysis, visualization and export.
     Converts durations to minutes and organizes data by route and season-year.
     """
-    combined_route_data = []
-
-    for route_id, data in route_dfs.items():
-        data['route_name'] = route_id
-        data['average_trip_duration_minutes'] = data['average_trip_duration'].dt.total_seconds() / 60.0
-        combined_route_data.append(data[['route_name', 'season-year', 'average_trip_duration_minutes']])
-
-    combined_df = pd.concat(combined_route_data, ignore_index=True)
-    combined_df.sort_values(by=['route_name', 'season-year'], inplace=True)
-    return combined_df
+    combined_df = route_data.rename(columns={'route_id': 'route_name'})
+    combined_df['average_trip_duration_minutes'] = combined_df['average_trip_duration'].dt.total_seconds() / 60.0
+    return combined_df[['route_name', 'season-year', 'average_trip_duration_minutes']]
 
 
 # --- Main Function ---
@@ -318,13 +254,11 @@ def combine_route_data(route_dfs):
 
 
 # Main function
-def main():
+def main(feeds=feeds):
     base_dir = "./datasets"
-    years = [2019, 2020, 2021, 2022, 2023, 2024]
-    seasons = ["Spring", "Fall", "Summer", "Winter"]
 
     # Step 1: Load and clean data
-    cleaned_data = load_cleaned_data(base_dir, years, seasons)
+    cleaned_data = load_cleaned_data(base_dir, years, seasons, feeds)
 
     # Step 2: Merge data
     merged_data = merge_cleaned_data(cleaned_data)
@@ -342,28 +276,21 @@ def main():
     # print("\nAverage Departure Times (Minutes Past Midnight) by Year and Season:")
     # print(average_departure_times)
 
-    route_dfs = aggregate_route_data(merged_data)
+    route_data = aggregate_route_data(merged_data)
 
-    combined_df = combine_route_data(route_dfs)
+    combined_df = combine_route_data(route_data)
 
     return combined_df
     print(combined_df)
 
 def plot_all_routes_chronological(df):
-    # Split the `season-year` column into `season` and `year`
-    df['season'] = df['season-year'].str[:-4]  
-    df['year'] = df['season-year'].str[-4:]  
-
-    # Define a custom order for the seasons
-    season_order = ["Fall", "Winter", "Spring", "Summer"]
-    
-    # Create a custom sorting key: first by year, then by the season order
-    df['season_rank'] = df['season'].map({season: i for i, season in enumerate(season_order)})
-    df['sort_key'] = df['year'] + df['season_rank'].astype(str)  
-    df = df.sort_values(by=['sort_key']) 
+    # plotting libraries are only imported when a figure is drawn
+    import matplotlib.pyplot as plt
 
-    # Combine `season` and `year` into properly formatted labels for the x-axis
-    df['season-year-clean'] = df['season'] + df['year'] 
+    # `season-year` is an ordered categorical, so its codes are the chronological x positions
+    df = df.sort_values(by='season-year')
+    season_years = df['season-year'].cat.remove_unused_categories()
+    x_positions = season_years.cat.codes
 
     # Create the figure
     fig, ax = plt.subplots(figsize=(15, 8))
@@ -371,13 +298,13 @@ def plot_all_routes_chronological(df):
     # Generate a unique color for each route using a colormap
     unique_routes = df['route_name'].unique()
     num_routes = len(unique_routes)
-    colors = matplotlib.cm.get_cmap('tab20', num_routes)  # Using the 'tab20' colormap for distinct colors
+    colors = plt.get_cmap('tab20', num_routes)  # Using the 'tab20' colormap for distinct colors
     
     # Plot a line for each route
     for i, route_id in enumerate(unique_routes):
-        route_df = df[df['route_name'] == route_id]
-        ax.plot(route_df['season-year-clean'], 
-                route_df['average_trip_duration_minutes'], 
+        is_route = df['route_name'] == route_id
+        ax.plot(x_positions[is_route], 
+                df.loc[is_route, 'average_trip_duration_minutes'], 
                 marker='o', 
                 label=route_id, 
                 color=colors(i))  # Assign a unique color
@@ -386,6 +313,8 @@ def plot_all_routes_chronological(df):
     ax.set_title("Average Trip Duration for All Routes (Chronological)", fontsize=18)
     ax.set_xlabel("Season-Year", fontsize=16)
     ax.set_ylabel("Average Trip Duration (minutes)", fontsize=16)
+    ax.set_xticks(range(len(season_years.cat.categories)))
+    ax.set_xticklabels(season_years.cat.categories)
     ax.tick_params(axis='x', rotation=45, labelsize=12)
     ax.tick_params(axis='y', labelsize=14)
     
@@ -0,0 +1,239 @@
+# On-disk cache for the GTFS archives listed in archived_feeds.txt.
+#
+# Archives are stored content-addressed (blobs/<sha256>.zip) and looked up by
+# archive_url through a small JSON index entry (urls/<sha256 of url>.json), so
+# every script that needs a feed downloads it at most once. Writes go through a
+# temp file + os.replace and are serialized with file locks, which keeps the
+# cache safe when several pipelines run at the same time. The total blob size
+# is bounded and the least recently used archives are evicted first.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import http_session
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to best-effort, lock-free writes
+    fcntl = None
+
+CACHE_DIR = os.environ.get('MBTA_ARCHIVE_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive_cache'))
+MAX_CACHE_BYTES = int(os.environ.get('MBTA_ARCHIVE_CACHE_MAX_BYTES', 4 * 1024 ** 3))
+CHUNK_SIZE = 1024 ** 2
+
+stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(counter):
+    with _stats_lock:
+        stats[counter] += 1
+
+
+def _url_key(archive_url):
+    return hashlib.sha256(archive_url.encode('utf-8')).hexdigest()
+
+
+def _paths(cache_dir):
+    blobs = os.path.join(cache_dir, 'blobs')
+    urls = os.path.join(cache_dir, 'urls')
+    locks = os.path.join(cache_dir, 'locks')
+    for path in (blobs, urls, locks):
+        os.makedirs(path, exist_ok=True)
+    return blobs, urls, locks
+
+
+@contextmanager
+def locked(lock_path):
+    """
+    Holds an exclusive lock on lock_path, across threads and processes.
+    """
+    with open(lock_path, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def atomic_write(path, data, mode='wb'):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _lookup(urls_dir, blobs_dir, url_key):
+    """
+    Returns the cached blob path for a url key, or None if it is not cached.
+    """
+    entry_path = os.path.join(urls_dir, f'{url_key}.json')
+    try:
+        with open(entry_path) as entry_file:
+            entry = json.load(entry_file)
+    except (OSError, ValueError):
+        return None
+    blob_path = os.path.join(blobs_dir, f"{entry['sha256']}.zip")
+    if not os.path.exists(blob_path) or os.path.getsize(blob_path) != entry['size']:
+        return None
+    return blob_path
+
+
+def _touch(blob_path):
+    """
+    Marks a blob as recently used. Returns False if it was evicted meanwhile.
+    """
+    try:
+        os.utime(blob_path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _download(archive_url, blobs_dir):
+    """
+    Streams an archive into the blob store and returns (sha256, size).
+    The body goes straight to a temp file, so it is never held in memory.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=blobs_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file, http_session.stream(archive_url) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                tmp_file.write(chunk)
+                sha256.update(chunk)
+                size += len(chunk)
+        blob_path = os.path.join(blobs_dir, f'{sha256.hexdigest()}.zip')
+        os.replace(tmp_path, blob_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return sha256.hexdigest(), size
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, keep=()):
+    """
+    Removes the least recently used archives until the cache fits in max_bytes.
+    Blobs listed in keep are never removed.
+    """
+    blobs_dir, urls_dir, locks_dir = _paths(cache_dir)
+    with locked(os.path.join(locks_dir, 'cache.lock')):
+        blobs = []
+        for name in os.listdir(blobs_dir):
+            if name.endswith('.zip'):
+                path = os.path.join(blobs_dir, name)
+                blob_stat = os.stat(path)
+                blobs.append((blob_stat.st_mtime, blob_stat.st_size, path))
+        total = sum(size for _, size, _ in blobs)
+        removed = set()
+        for _, size, path in sorted(blobs):
+            if total <= max_bytes:
+                break
+            if path in keep:
+                continue
+            os.remove(path)
+            removed.add(os.path.basename(path)[:-len('.zip')])
+            total -= size
+            _count('evictions')
+
+        # drop index entries that point at evicted blobs
+        if removed:
+            for name in os.listdir(urls_dir):
+                entry_path = os.path.join(urls_dir, name)
+                try:
+                    with open(entry_path) as entry_file:
+                        if json.load(entry_file)['sha256'] in removed:
+                            os.remove(entry_path)
+                except (OSError, ValueError, KeyError):
+                    continue
+
+
+def get_archive_path(archive_url, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Returns the local path of the archive at archive_url, downloading it on a miss.
+    """
+    blobs_dir, urls_dir, locks_dir = _paths(cache_dir)
+    url_key = _url_key(archive_url)
+
+    blob_path = _lookup(urls_dir, blobs_dir, url_key)
+    if blob_path is not None and _touch(blob_path):
+        _count('hits')
+        return blob_path
+
+    # only one process downloads a given url, the others wait and then hit
+    with locked(os.path.join(locks_dir, f'{url_key}.lock')):
+        blob_path = _lookup(urls_dir, blobs_dir, url_key)
+        if blob_path is not None and _touch(blob_path):
+            _count('hits')
+            return blob_path
+
+        _count('misses')
+        sha256, size = _download(archive_url, blobs_dir)
+        entry = {'url': archive_url, 'sha256': sha256, 'size': size}
+        atomic_write(os.path.join(urls_dir, f'{url_key}.json'), json.dumps(entry), mode='w')
+        blob_path = os.path.join(blobs_dir, f'{sha256}.zip')
+        evict(cache_dir, max_bytes, keep=(blob_path,))
+    return blob_path
+
+
+def cached_path(archive_url, cache_dir=CACHE_DIR):
+    """
+    Returns the local path of archive_url if it is already cached, else None.
+    Never downloads.
+    """
+    blobs_dir, urls_dir, _ = _paths(cache_dir)
+    blob_path = _lookup(urls_dir, blobs_dir, _url_key(archive_url))
+    if blob_path is not None and _touch(blob_path):
+        _count('hits')
+        return blob_path
+    return None
+
+
+def open_archive(archive_url, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Opens the (cached) archive at archive_url as a ZipFile.
+    """
+    return zipfile.ZipFile(get_archive_path(archive_url, cache_dir, max_bytes))
+
+
+def cache_stats():
+    """
+    Returns a copy of the hit / miss / eviction counters for this process.
+    """
+    with _stats_lock:
+        return dict(stats)
+
+
+def prefetch(archive_urls, max_workers=8, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Downloads the given archives into the cache concurrently.
+    Returns a dict of archive_url -> local path for the ones that succeeded.
+    """
+    archive_urls = list(dict.fromkeys(archive_urls))
+
+    def fetch(archive_url):
+        try:
+            return archive_url, get_archive_path(archive_url, cache_dir, max_bytes)
+        except Exception as e:
+            print(f"Failed to fetch {archive_url}: {e}")
+            return archive_url, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(fetch, archive_urls)
+        return {archive_url: path for archive_url, path in results if path is not None}
@@ -0,0 +1,230 @@
+# Typed loads of DataFrames into BigQuery.
+#
+# The pipelines used to cast every column to str before uploading. Here the
+# BigQuery schema is derived from the column types instead: the dtypes of the
+# GTFS tables come from gtfs_schema, YYYYMMDD service dates become DATE, and
+# every HH:MM:SS time gets an INT64 <name>_seconds column next to it (BigQuery
+# TIME cannot hold service-day times past 24:00, so the text is kept as well).
+# The frame is sent as Parquet with the explicit SchemaFields.
+#
+# partitioned_job_config sets up appends into one table per GTFS table for all
+# feeds, range partitioned on the feed (year and season) and clustered on
+# route_id / trip_id, so a query over one season or line only scans its part.
+#
+# LoadQueue runs the loads of a pipeline on one shared client, several at a
+# time, and reports every failed load together once they have all finished.
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+try:
+    from google.cloud import bigquery
+except ImportError:  # only the column typing is usable, e.g. by the local warehouse sink
+    bigquery = None
+
+import gtfs_schema
+import gtfs_time
+
+INT64 = 'INT64'
+FLOAT64 = 'FLOAT64'
+BOOL = 'BOOL'
+STRING = 'STRING'
+DATE = 'DATE'
+TIMESTAMP = 'TIMESTAMP'
+
+SEASON_NUMBERS = {'Winter': 1, 'Spring': 2, 'Summer': 3, 'Fall': 4}
+PARTITION_FIELD = 'feed_partition'
+PARTITION_RANGE = (20000, 21000)  # feed_partition values of the years 2000-2099
+CLUSTER_FIELDS = ['route_id', 'trip_id']
+MAX_CONCURRENT_LOADS = int(os.environ.get('MBTA_BIGQUERY_MAX_LOADS', 4))
+
+
+def bigquery_type(dtype):
+    """
+    Returns the BigQuery type of a pandas dtype.
+    """
+    if isinstance(dtype, pd.CategoricalDtype):
+        return bigquery_type(dtype.categories.dtype)
+    if pd.api.types.is_bool_dtype(dtype):
+        return BOOL
+    if pd.api.types.is_integer_dtype(dtype):
+        return INT64
+    if pd.api.types.is_float_dtype(dtype):
+        return FLOAT64
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return TIMESTAMP
+    return STRING
+
+
+def prepare_table(df, table_name=None):
+    """
+    Returns a copy of df ready for a typed load: the index is turned into
+    columns if it carries information, GTFS dates are parsed and GTFS times get
+    a seconds column. Columns are typed from gtfs_schema where the table is known.
+    """
+    if isinstance(df.index, pd.MultiIndex) or df.index.name is not None:
+        df = df.reset_index()
+    known = gtfs_schema.TABLES.get(table_name, {})
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if column in gtfs_schema.DATE_COLUMNS and not pd.api.types.is_numeric_dtype(values):
+            values = pd.to_datetime(values, format='%Y%m%d', errors='coerce').dt.date
+        elif column in known and known[column] is not str:
+            try:
+                values = values.astype(known[column])
+            except (TypeError, ValueError):
+                pass  # left to the type pandas inferred
+        columns[column] = values
+        if column in gtfs_schema.TIME_COLUMNS and not pd.api.types.is_numeric_dtype(values):
+            seconds, valid = gtfs_time.parse_times(values)
+            columns[column.replace('_time', '_seconds')] = seconds.astype('Int32').where(valid)
+    return pd.DataFrame(columns, index=df.index)
+
+
+def column_types(df):
+    """
+    Returns (column name, BigQuery type) pairs for a frame prepared with
+    prepare_table.
+    """
+    types = []
+    for column in df.columns:
+        if column in gtfs_schema.DATE_COLUMNS and df[column].dtype == object:
+            field_type = DATE
+        else:
+            field_type = bigquery_type(df[column].dtype)
+        types.append((str(column), field_type))
+    return types
+
+
+def schema_for(df):
+    """
+    Returns the BigQuery SchemaFields of a frame prepared with prepare_table.
+    """
+    return [bigquery.SchemaField(column, field_type, mode='NULLABLE') for column, field_type in column_types(df)]
+
+
+def load_dataframe(client, df, table_ref, table_name=None, job_config=None):
+    """
+    Starts a typed Parquet load of df into table_ref and returns the load job.
+    table_name is the GTFS table df holds, if any.
+    """
+    df = prepare_table(df, table_name)
+    job_config = job_config or bigquery.LoadJobConfig()
+    job_config.schema = schema_for(df)
+    job_config.source_format = bigquery.SourceFormat.PARQUET
+    return client.load_table_from_dataframe(df, table_ref, job_config=job_config)
+
+
+def feed_partition(year, season):
+    """
+    Returns the partition number of a feed, e.g. 20243 for Summer 2024.
+    """
+    return year * 10 + SEASON_NUMBERS[season]
+
+
+def append_job_config():
+    """
+    Returns the LoadJobConfig appending to a table. The table is created on
+    the first load and gains new columns as later feeds add them.
+    """
+    job_config = bigquery.LoadJobConfig()
+    job_config.write_disposition = bigquery.WriteDisposition.WRITE_APPEND
+    job_config.create_disposition = bigquery.CreateDisposition.CREATE_IF_NEEDED
+    job_config.schema_update_options = [bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION]
+    return job_config
+
+
+def partitioned_job_config(columns):
+    """
+    Returns the append LoadJobConfig for a table range partitioned on
+    PARTITION_FIELD and clustered on whichever CLUSTER_FIELDS are in columns.
+    """
+    start, end = PARTITION_RANGE
+    job_config = append_job_config()
+    job_config.range_partitioning = bigquery.RangePartitioning(
+        field=PARTITION_FIELD, range_=bigquery.PartitionRange(start=start, end=end, interval=1))
+    clustering_fields = [column for column in CLUSTER_FIELDS if column in columns]
+    if clustering_fields:
+        job_config.clustering_fields = clustering_fields
+    return job_config
+
+
+def delete_feed_rows(client, table_ref, year, season=None):
+    """
+    Deletes the rows of a year's feeds (or of one season's feed) from
+    table_ref, so they can be loaded again without being duplicated.
+    """
+    query = f"DELETE FROM `{table_ref.project}.{table_ref.dataset_id}.{table_ref.table_id}` WHERE year = @year"
+    parameters = [bigquery.ScalarQueryParameter('year', INT64, year)]
+    if season is not None:
+        query += " AND season = @season"
+        parameters.append(bigquery.ScalarQueryParameter('season', STRING, season))
+    client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=parameters)).result()
+
+
+class LoadError(Exception):
+    """
+    Raised by LoadQueue.wait when loads failed. errors holds a (table_ref,
+    exception) pair for each failed load and loaded the table_refs that made it.
+    """
+
+    def __init__(self, errors, loaded):
+        self.errors = errors
+        self.loaded = loaded
+        lines = [f'{table_ref}: {error}' for table_ref, error in errors]
+        super().__init__(f'{len(errors)} of {len(errors) + len(loaded)} loads failed:\n' + '\n'.join(lines))
+
+
+class LoadQueue:
+    """
+    Runs typed loads (see load_dataframe) on one client, at most
+    max_concurrent at a time. submit blocks while that many loads are running,
+    so frames do not pile up in memory waiting for a slot.
+    """
+
+    def __init__(self, client, max_concurrent=MAX_CONCURRENT_LOADS):
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='bigquery_load')
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._pending = []
+
+    def submit(self, df, table_ref, table_name=None, job_config=None):
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._load, df, table_ref, table_name, job_config)
+        except Exception:
+            self._slots.release()
+            raise
+        self._pending.append((table_ref, future))
+        return future
+
+    def _load(self, df, table_ref, table_name, job_config):
+        try:
+            job = load_dataframe(self.client, df, table_ref, table_name, job_config)
+            return job.result()  # wait for job to complete
+        finally:
+            self._slots.release()
+
+    def wait(self):
+        """
+        Waits for every submitted load and returns the table_refs loaded.
+        Raises LoadError listing all the failed loads if any failed.
+        """
+        pending, self._pending = self._pending, []
+        loaded, errors = [], []
+        for table_ref, future in pending:
+            try:
+                future.result()
+                loaded.append(table_ref)
+            except Exception as e:
+                errors.append((table_ref, e))
+        if errors:
+            raise LoadError(errors, loaded)
+        return loaded
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -1,95 +1,173 @@
-import requests
-from bs4 import BeautifulSoup
 import pandas as pd
-import zipfile
 import os
-from io import BytesIO
-from io import StringIO
-import re
-from google.cloud import bigquery
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+import archive_cache
+import bigquery_load
+from feed_catalog import find_feed_url
+import feed_tables
+import load_manifest
+import sinks
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-y', '--year_range', type=str, help='Year range in the format "start-end"', required=True)
 parser.add_argument('-p', '--project', type=str, help='BigQuery project ID', required=True)
+parser.add_argument('-w', '--workers', type=int, default=8, help='number of archives to download in parallel')
+parser.add_argument('-d', '--dataset', type=str, help='append every year to this single dataset, partitioned by feed and clustered on route_id/trip_id, instead of one dataset per year')
+parser.add_argument('-c', '--concurrency', type=int, default=bigquery_load.MAX_CONCURRENT_LOADS, help='number of BigQuery load jobs to run at the same time')
+parser.add_argument('-s', '--stream', action='store_true', help='append each season to BigQuery as soon as it is parsed instead of merging whole years in memory')
+parser.add_argument('-l', '--local', type=str, help='load into a local SQLite warehouse in this directory instead of BigQuery')
+parser.add_argument('-m', '--manifest', type=str, help='file recording the feed tables already loaded, which later runs skip (load_manifest.jsonl, inside the --local directory if given)')
+parser.add_argument('-f', '--force', action='store_true', help='reload every feed even if the manifest has it already')
 args = parser.parse_args()
 
-url = "https://cdn.mbta.com/archive/archived_feeds.txt"
-response = requests.get(url)
-soup = BeautifulSoup(response.content, 'html.parser')
-
-def get_db():
-    data = pd.read_csv(StringIO(soup.get_text()))
-    data['season'] = data['feed_version'].apply(
-        lambda x: re.search(r'(Fall|Spring|Summer|Winter)', x).group(0) if re.search(r'(Fall|Spring|Summer|Winter)', x) else None
-    )
-    data['year'] = data['feed_version'].apply(
-        lambda x: re.search(r'\b(20\d{2})\b', x).group(0) if re.search(r'\b(20\d{2})\b', x) else None
-    )
-    return data
-
-def extract_table_data(zip_url):
-    response = requests.get(zip_url)
-    zip_file = zipfile.ZipFile(BytesIO(response.content))
-    tables = {}
-    for file_info in zip_file.infolist():
-        file_name = file_info.filename
-        if file_name.endswith('.txt'):
-            with zip_file.open(file_name) as file:
-                table_name = os.path.splitext(file_name)[0]
-                df = pd.read_csv(file)
-                if table_name in tables:
-                    tables[table_name] = pd.concat([tables[table_name], df], ignore_index=True)
-                else:
-                    tables[table_name] = df
-    return tables
-
-def convert_column_types(df):
-    for column in df.columns:
-        df[column] = df[column].astype(str)
-    return df
-
-def upload_to_bigquery(dataframe, project_id, dataset_name, table_name):
-    client = bigquery.Client(project=project_id)
-    dataset_ref = client.dataset(dataset_name)
-    table_ref = dataset_ref.table(table_name)
-    job = client.load_table_from_dataframe(dataframe, table_ref)
-    job.result()  # wait for job to complete
+seasons = ['Fall', 'Spring', 'Summer', 'Winter']
+
+def add_feed_columns(table_data, year, season):
+    table_data['year'] = year
+    table_data['season'] = season
+    if args.dataset:
+        table_data[bigquery_load.PARTITION_FIELD] = bigquery_load.feed_partition(year, season)
+    return table_data
+
+def upload_to_bigquery(sink, dataframe, dataset_name, table_name):
+    # typed load, schema derived from the column types; the single dataset is partitioned by feed
+    return sink.submit(dataframe, dataset_name, table_name, partitioned=bool(args.dataset))
+
+def destination(dataset_id, table_name):
+    return f"{args.project}.{dataset_id}.{table_name}"
+
+def remove_loaded_rows(manifest, sink, dataset_id, table_name, year, season=None):
+    # rows of an earlier version of the feed are replaced, not appended to
+    if manifest.entries(destination(dataset_id, table_name), year, season) or args.force:
+        try:
+            sink.delete_feed_rows(dataset_id, table_name, year, season)
+        except Exception as e:
+            print(f"Could not delete the earlier rows of {table_name} for {season or ''} {year}: {e}")
+
+def record_when_loaded(manifest, future, entries):
+    """
+    Records the manifest entries once the load behind future has succeeded.
+    """
+    def record(future):
+        if future.exception() is None:
+            for entry in entries:
+                manifest.record(**entry)
+    future.add_done_callback(record)
+
+def wait_for_uploads(sink):
+    """
+    Waits for the submitted loads, reports every failed one and returns
+    whether they all succeeded.
+    """
+    failed = False
+    try:
+        loaded = sink.wait()
+    except bigquery_load.LoadError as e:
+        loaded, failed = e.loaded, True
+        print(e)
+    for table_ref in loaded:
+        print(f"Uploaded {table_ref.table_id} to BigQuery dataset {table_ref.dataset_id}.")
+    return not failed
+
+def stream_feeds(sink, manifest, feeds):
+    """
+    Appends the tables of each (year, season, zip_url) feed to BigQuery one
+    table at a time, so only the tables being loaded are held in memory. The
+    next feed's archive downloads in the background while the current one
+    uploads. Tables the manifest has with the same content are skipped.
+    """
+    with ThreadPoolExecutor(max_workers=1) as downloader:
+        download = downloader.submit(archive_cache.get_archive_path, feeds[0][2]) if feeds else None
+        for i, (year, season, zip_url) in enumerate(feeds):
+            download.result()
+            if i + 1 < len(feeds):
+                download = downloader.submit(archive_cache.get_archive_path, feeds[i + 1][2])
+
+            dataset_id = args.dataset or f"{year}_data"
+            with feed_tables.extract_tables(zip_url) as tables:
+                for table_name in tables:
+                    table_destination = destination(dataset_id, table_name)
+                    content_hash = tables.content_hash(table_name)
+                    if not args.force and manifest.is_current(table_destination, year, season, content_hash):
+                        entry = manifest.get(table_destination, year, season)
+                        if entry['archive_url'] != zip_url:
+                            manifest.record(table_destination, year, season, zip_url, content_hash, entry['rows'], tables)
+                        continue
+
+                    remove_loaded_rows(manifest, sink, dataset_id, table_name, year, season)
+                    table_data = add_feed_columns(tables.read(table_name), year, season)
+                    future = upload_to_bigquery(sink, table_data, dataset_id, table_name)
+                    record_when_loaded(manifest, future, [dict(destination=table_destination, year=year, season=season, archive_url=zip_url,
+                                                               content_hash=content_hash, rows=len(table_data), feed_tables=list(tables))])
+                    del table_data
+
+def upload_year(sink, manifest, year, year_feeds):
+    """
+    Merges the seasons of each table of a year and uploads the tables whose
+    content changed in any season since the manifest last recorded them.
+    """
+    dataset_id = args.dataset or f"{year}_data"
+    hashes = {}
+    for season, zip_url in year_feeds:
+        with feed_tables.extract_tables(zip_url) as tables:
+            hashes[season] = {table_name: tables.content_hash(table_name) for table_name in tables}
+    changed = {table_name for season, season_hashes in hashes.items() for table_name, content_hash in season_hashes.items()
+               if args.force or not manifest.is_current(destination(dataset_id, table_name), year, season, content_hash)}
+
+    # merge the changed tables, concatenating every season once
+    season_tables = {}
+    for season, zip_url in year_feeds:
+        with feed_tables.extract_tables(zip_url, changed) as tables:
+            for table_name in tables:
+                season_tables.setdefault(table_name, []).append((season, zip_url, add_feed_columns(tables.read(table_name), year, season)))
+        for table_name in set(hashes[season]) - changed:
+            entry = manifest.get(destination(dataset_id, table_name), year, season)
+            if entry['archive_url'] != zip_url:
+                manifest.record(entry['destination'], year, season, zip_url, entry['content_hash'], entry['rows'], hashes[season])
+
+    for table_name, parts in season_tables.items():
+        remove_loaded_rows(manifest, sink, dataset_id, table_name, year)
+        table_data = pd.concat([part for _, _, part in parts], ignore_index=True)
+        future = upload_to_bigquery(sink, table_data, dataset_id, table_name)
+        record_when_loaded(manifest, future, [dict(destination=destination(dataset_id, table_name), year=year, season=season, archive_url=zip_url,
+                                                   content_hash=hashes[season][table_name], rows=len(part), feed_tables=hashes[season])
+                                              for season, zip_url, part in parts])
 
 if __name__ == '__main__':
     start_year, end_year = map(int, args.year_range.split('-'))
     project_id = args.project
+    years = range(start_year, end_year + 1)
+    feeds = [(year, season, find_feed_url(year, season)) for year in years for season in seasons]
+    feeds = [(year, season, zip_url) for year, season, zip_url in feeds if zip_url is not None]
 
-    db = get_db()
-    client = bigquery.Client(project=project_id)
-    for year in range(start_year, end_year + 1):
-        dataset_id = f"{year}_data"
-        dataset_ref = client.dataset(dataset_id)
-        dataset = bigquery.Dataset(dataset_ref)
-        dataset.location = "US"
-        try:
-            client.create_dataset(dataset)  # create dataset if it doesn't exist
-        except Exception as e:
-            print(f"Dataset {dataset_id} already exists.")
-
-        # merge the tables
-        merged_tables = {}
-        for season in ['Fall', 'Spring', 'Summer', 'Winter']:
-            filtered_data = db[(db['season'] == season) & (db['year'] == str(year))]
-            if not filtered_data.empty:
-                zip_url = filtered_data.iloc[0]['archive_url']
-                tables = extract_table_data(zip_url)
-                for table_name, table_data in tables.items():
-                    table_data['year'] = str(year)
-                    table_data['season'] = season
-                    if table_name in merged_tables:
-                        merged_tables[table_name] = pd.concat([merged_tables[table_name], table_data], ignore_index=True)
-                    else:
-                        merged_tables[table_name] = table_data
-
-        # uploading the merged tables to bigquery
-        for table_name, table_data in merged_tables.items():
-            table_data = convert_column_types(table_data)
-            upload_to_bigquery(table_data, project_id, dataset_id, table_name)
-            print(f"Uploaded {table_name} for year {year} to BigQuery dataset {dataset_id}.")
+    # feeds loaded from the same archive before are skipped without downloading them
+    manifest_path = args.manifest or (os.path.join(args.local, 'load_manifest.jsonl') if args.local else load_manifest.MANIFEST_PATH)
+    manifest = load_manifest.LoadManifest(manifest_path)
+    loaded = {feed for feed in feeds
+              if not args.force and manifest.feed_loaded(f"{project_id}.{args.dataset or f'{feed[0]}_data'}", *feed)}
+    if args.stream:
+        pending = [feed for feed in feeds if feed not in loaded]
+    else:
+        # a year is merged as a whole, so any new or changed feed reloads the year
+        pending_years = {year for year, season, zip_url in feeds if (year, season, zip_url) not in loaded}
+        pending = [feed for feed in feeds if feed[0] in pending_years]
+    print(f"{len(feeds) - len(pending)} of {len(feeds)} feeds already loaded.")
+
+    sink = sinks.open_sink(project_id, args.local, args.concurrency)
+    for dataset_id in dict.fromkeys(args.dataset or f"{year}_data" for year, _, _ in pending):
+        sink.create_dataset(dataset_id)
+
+    if args.stream:
+        stream_feeds(sink, manifest, pending)
+    else:
+        # download every archive still to be loaded up front, in parallel
+        archive_cache.prefetch([zip_url for _, _, zip_url in pending], max_workers=args.workers)
+        for year in dict.fromkeys(year for year, _, _ in pending):
+            upload_year(sink, manifest, year, [(season, zip_url) for feed_year, season, zip_url in pending if feed_year == year])
 
+    uploaded = wait_for_uploads(sink)
+    sink.close()
+    print(f"Archive cache: {archive_cache.cache_stats()}")
+    if not uploaded:
+        raise SystemExit(1)
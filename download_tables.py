@@ -1,49 +1,42 @@
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-import zipfile
-import os
-from io import BytesIO
-import re
-from io import StringIO
 import argparse
+import archive_cache
+import feed_store
+from feed_catalog import find_feed_url
 from itertools import product
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-s', '--seasons', nargs='+', help='a list of the seasons', required=True)    
 parser.add_argument('-y', '--years', nargs='+', help='a list of the years', required=True)
 parser.add_argument('-t', '--tables', nargs='+', help='a list of the tables', required=True)
+parser.add_argument('-w', '--workers', type=int, default=8, help='number of archives to download in parallel')
+parser.add_argument('-f', '--format', choices=['txt', 'parquet'], default='txt', help='extract the raw .txt files or convert the tables into the Parquet feed store')
 args = parser.parse_args()
 
-url = "https://cdn.mbta.com/archive/archived_feeds.txt"
-response = requests.get(url)
-soup = BeautifulSoup(response.content, 'html.parser')
-
-def get_db():
-    data = pd.read_csv(StringIO(soup.get_text()))
-    data['season'] = data['feed_version'].apply(lambda x: re.search(r'(Fall|Spring|Summer|Winter)', x).group(0) if re.search(r'(Fall|Spring|Summer|Winter)', x) else None)
-    data['year'] = data['feed_version'].apply(lambda x: re.search(r'\b(20\d{2})\b', x).group(0) if re.search(r'\b(20\d{2})\b', x) else None)
-    return data
-
 def extract_tables(zip_url, table_names, output_dir = './'):
-    response = requests.get(zip_url)
-    zip_file = zipfile.ZipFile(BytesIO(response.content))
-    for file_info in zip_file.infolist():
-        if str(file_info.filename).split('.')[0] in table_names:
-            zip_file.extract(file_info, output_dir)
+    with archive_cache.open_archive(zip_url) as zip_file:
+        for file_info in zip_file.infolist():
+            if str(file_info.filename).split('.')[0] in table_names:
+                zip_file.extract(file_info, output_dir)
 
-def download_datasets(db, season, year, tables):
-    filtered_data = db[(db['season'] == str(season)) & (db['year'] == str(year))]
-    zip_url = filtered_data.iloc[0]['archive_url']
+def download_datasets(season, year, tables):
+    zip_url = find_feed_url(year, season)
+    if zip_url is None:
+        print(f'No feed found for {season} {year}')
+        return
     extract_tables(zip_url, tables, f'./datasets/{season}_{year}/')
 
 if __name__ == '__main__':
     seasons = args.seasons
     years = args.years
     tables = args.tables
-    
-    db = get_db()
+
+    # download all the archives in parallel before extracting from them
+    zip_urls = [find_feed_url(year, season) for season, year in product(seasons, years)]
+    archive_cache.prefetch([zip_url for zip_url in zip_urls if zip_url is not None], max_workers=args.workers)
 
     for season, year in product(seasons, years):
         print(season, year)
-        download_datasets(db, season, year, tables)
+        if args.format == 'parquet':
+            feed_store.ingest(year, season, tables)
+        else:
+            download_datasets(season, year, tables)
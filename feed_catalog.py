@@ -0,0 +1,161 @@
+# Catalog of the archived MBTA GTFS feeds (archived_feeds.txt).
+#
+# The catalog is only fetched the first time something asks for it, and is
+# kept on disk next to the archive cache. Later runs revalidate the local copy
+# with a conditional GET (ETag / Last-Modified), so an unchanged catalog costs
+# one 304 round trip, and an unreachable server falls back to the local copy.
+
+import json
+import os
+
+import pandas as pd
+import requests
+
+import archive_cache
+import http_session
+
+ARCHIVED_FEEDS_URL = "https://cdn.mbta.com/archive/archived_feeds.txt"
+CATALOG_DIR = os.path.join(archive_cache.CACHE_DIR, 'catalog')
+
+
+def full_year(year):
+    """
+    Normalizes a year given as 2019, '2019' or 19 to the int 2019.
+    """
+    year = int(year)
+    return year + 2000 if year < 100 else year
+
+
+class FeedCatalog:
+    """
+    Lazily loaded, locally persisted copy of archived_feeds.txt.
+    """
+
+    def __init__(self, url=ARCHIVED_FEEDS_URL, catalog_dir=CATALOG_DIR):
+        self.url = url
+        self.path = os.path.join(catalog_dir, os.path.basename(url))
+        self.meta_path = self.path + '.json'
+        self._revalidated = False
+        self._db = None
+        self._index = None
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path) as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return {}
+
+    def refresh(self):
+        """
+        Revalidates the local copy against the server, downloading it if it
+        changed. Keeps the local copy if the server cannot be reached.
+        """
+        meta = self._read_meta() if os.path.exists(self.path) else {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response = http_session.get(self.url, headers=headers, timeout=30)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            if not os.path.exists(self.path):
+                raise
+            print(f"Could not revalidate {self.url} ({e}), using local copy.")
+        else:
+            if response.status_code != 304:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                archive_cache.atomic_write(self.path, response.content)
+                meta = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }
+                archive_cache.atomic_write(self.meta_path, json.dumps(meta), mode='w')
+                self._db = None
+        self._revalidated = True
+
+    def text(self):
+        """
+        Returns the raw catalog text.
+        """
+        if not self._revalidated:
+            self.refresh()
+        with open(self.path, encoding='utf-8') as catalog_file:
+            return catalog_file.read()
+
+    @property
+    def db(self):
+        """
+        The catalog as a DataFrame, with season, year and the feed's start /
+        end dates parsed out of each row.
+        """
+        if not self._revalidated:
+            self.refresh()
+        if self._db is None:
+            data = pd.read_csv(self.path, dtype={'feed_start_date': str, 'feed_end_date': str})
+            data['season'] = data['feed_version'].str.extract(r'(Fall|Spring|Summer|Winter)', expand=False)
+            data['year'] = data['feed_version'].str.extract(r'\b(20\d{2})\b', expand=False)
+            data['start_date'] = pd.to_datetime(data['feed_start_date'], format='%Y%m%d', errors='coerce')
+            data['end_date'] = pd.to_datetime(data['feed_end_date'], format='%Y%m%d', errors='coerce')
+            self._db = data
+            self._index = None
+        return self._db
+
+    @property
+    def index(self):
+        """
+        Maps (year, season) -> the catalog row of the newest feed for that season.
+
+        When several feeds match, the newest is the one with the latest
+        start_date, then the latest end_date, then the one listed first in
+        archived_feeds.txt (the MBTA lists newer versions first).
+        """
+        data = self.db
+        if self._index is None:
+            newest = (
+                data.dropna(subset=['season', 'year'])
+                .sort_values(['start_date', 'end_date'], ascending=False, kind='stable', na_position='last')
+                .drop_duplicates(subset=['year', 'season'], keep='first')
+            )
+            self._index = {
+                (int(row['year']), row['season']): row
+                for row in newest.to_dict(orient='records')
+            }
+        return self._index
+
+    def find_feed(self, year, season):
+        """
+        Returns the catalog row of the newest feed for year / season, or None.
+        Two digit years (19, 24) are read as 20xx.
+        """
+        return self.index.get((full_year(year), season))
+
+    def find_feed_url(self, year, season):
+        """
+        Returns the archive_url of the newest feed for year / season, or None.
+        """
+        feed = self.find_feed(year, season)
+        return None if feed is None else feed['archive_url']
+
+
+_catalogs = {}
+
+
+def get_catalog(url=ARCHIVED_FEEDS_URL):
+    """
+    Returns the shared FeedCatalog for url, so a process fetches it at most once.
+    """
+    if url not in _catalogs:
+        _catalogs[url] = FeedCatalog(url)
+    return _catalogs[url]
+
+
+def get_db():
+    return get_catalog().db
+
+
+def find_feed_url(year, season):
+    return get_catalog().find_feed_url(year, season)
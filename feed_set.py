@@ -0,0 +1,143 @@
+# In-memory registry of the GTFS tables the analyses work on.
+#
+# A FeedSet hands out tables keyed by (year, season, table name), loading each
+# one from the Parquet feed store the first time it is asked for. It tracks
+# the deep memory usage of every table it holds and, once a memory budget is
+# exceeded, drops the least recently used tables again. Raw tables are simply
+# reread from the feed store when they are needed next; tables that went
+# through a prepare function are spilled to a temporary Parquet file first so
+# the preparation is not redone. Analyses running in parallel threads can
+# share one FeedSet, so every table is held once under one budget.
+
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import feed_store
+from feed_catalog import full_year
+
+MEMORY_BUDGET = int(os.environ.get('MBTA_FEED_MEMORY_BUDGET', 2 * 1024 ** 3))
+
+
+class FeedSet:
+    """
+    Lazily loaded tables keyed by (year, season, table name), kept under
+    memory_budget bytes (None for no limit). prepare maps a table name to a
+    function applied to the table once after it is loaded, and columns maps a
+    table name to the only columns to read. Years may be given as 2019 or 19,
+    so analyses keying feeds either way share the same tables.
+    """
+
+    def __init__(self, years, seasons, table_names, prepare=None, columns=None,
+                 memory_budget=MEMORY_BUDGET, store_dir=None):
+        self.years = [full_year(year) for year in years]
+        self.seasons = list(seasons)
+        self.table_names = list(table_names)
+        self._prepare = prepare or {}
+        self._columns = columns or {}
+        self.memory_budget = memory_budget
+        self._store_dir = store_dir or feed_store.STORE_DIR
+        self._spill_dir = None
+        self._spilled = set()
+        self._missing = set()
+        self._tables = OrderedDict()  # key -> (DataFrame, bytes), least recently used first
+        self._loading = {}  # key -> lock held while the table is loaded
+        self._lock = threading.RLock()
+        self.stats = {'loads': 0, 'hits': 0, 'evictions': 0, 'spills': 0}
+
+    def keys(self):
+        return [(year, season, table_name) for year in self.years for season in self.seasons
+                for table_name in self.table_names]
+
+    def get(self, year, season, table_name):
+        """
+        Returns the table, or None if the feed or the table does not exist.
+        Any other failure to load or prepare the table is raised.
+        """
+        key = (full_year(year), season, table_name)
+        while True:
+            with self._lock:
+                df = self._cached(key)
+                if df is not None or key in self._missing:
+                    return df
+                key_lock = self._loading.setdefault(key, threading.Lock())
+            # tables are loaded outside the registry lock so the analyses sharing
+            # it load different tables in parallel, but each table only once
+            with key_lock:
+                with self._lock:
+                    if self._loading.get(key) is not key_lock:
+                        continue  # loaded by another thread meanwhile
+                try:
+                    df = self._load(key)
+                    with self._lock:
+                        if df is None:
+                            self._missing.add(key)
+                        else:
+                            self._tables[key] = (df, int(df.memory_usage(deep=True).sum()))
+                            self._evict()
+                except FileNotFoundError:
+                    # the partition went away under us, so it is not remembered as missing
+                    print(f'Feed not available for {key[1]} {key[0]}')
+                    return None
+                finally:
+                    with self._lock:
+                        del self._loading[key]
+                return df
+
+    def _cached(self, key):
+        if key in self._tables:
+            self._tables.move_to_end(key)
+            self.stats['hits'] += 1
+            return self._tables[key][0]
+        return None
+
+    def __getitem__(self, key):
+        df = self.get(*key)
+        if df is None:
+            raise KeyError(key)
+        return df
+
+    def __contains__(self, key):
+        return self.get(*key) is not None
+
+    def _load(self, key):
+        year, season, table_name = key
+        with self._lock:
+            self.stats['loads'] += 1
+        if key in self._spilled:
+            return pd.read_parquet(self._spill_path(key))
+        tables = feed_store.load_tables(year, season, [table_name], self._columns, self._store_dir)
+        df = tables.get(table_name)
+        if df is not None and table_name in self._prepare:
+            df = self._prepare[table_name](df)
+        return df
+
+    def _spill_path(self, key):
+        year, season, table_name = key
+        return os.path.join(self._spill_dir.name, f'{table_name}_{year}_{season}.parquet')
+
+    def _evict(self):
+        # the table that was just loaded is the most recently used and always stays
+        while self.memory_budget is not None and len(self._tables) > 1 and self.memory_usage() > self.memory_budget:
+            key, (df, _) = self._tables.popitem(last=False)
+            year, season, table_name = key
+            if table_name in self._prepare and key not in self._spilled:
+                if self._spill_dir is None:
+                    self._spill_dir = tempfile.TemporaryDirectory(prefix='feed_set_')
+                df.to_parquet(self._spill_path(key), engine='pyarrow', compression=feed_store.COMPRESSION, index=False)
+                self._spilled.add(key)
+                self.stats['spills'] += 1
+            self.stats['evictions'] += 1
+
+    def memory_usage(self):
+        """
+        Returns the deep memory usage in bytes of the tables currently held.
+        """
+        return sum(size for _, size in self._tables.values())
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
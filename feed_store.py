@@ -0,0 +1,150 @@
+# Local Parquet store of the GTFS feed tables.
+#
+# Each table of each season's feed is converted from CSV once and kept as
+# <store>/<table>/year=<year>/season=<season>/data.parquet, zstd compressed,
+# typed with gtfs_schema and with row group statistics. The analyses read
+# only the partitions (year, season) and columns they need, instead of
+# reparsing the CSV members of the archives on every run. Tables a feed does
+# not have are remembered with an empty "missing" marker so the archive is not
+# opened again to look for them. Every partition also keeps the archive_url it
+# was converted from in a "source" file: when the catalog points a season at a
+# different archive, its tables and markers are converted again. Partitions
+# are written through a unique temp file under a per-partition lock, so
+# parallel ingests of the same feed cannot interleave their writes.
+
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import feed_tables
+from archive_cache import atomic_write, locked
+from feed_catalog import find_feed_url, full_year
+
+STORE_DIR = os.environ.get('MBTA_FEED_STORE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'feed_store'))
+ROW_GROUP_SIZE = 250_000
+COMPRESSION = 'zstd'
+
+
+def partition_dir(table_name, year, season, store_dir=STORE_DIR):
+    return os.path.join(store_dir, table_name, f'year={full_year(year)}', f'season={season}')
+
+
+def _data_path(table_name, year, season, store_dir):
+    return os.path.join(partition_dir(table_name, year, season, store_dir), 'data.parquet')
+
+
+def _missing_path(table_name, year, season, store_dir):
+    return os.path.join(partition_dir(table_name, year, season, store_dir), 'missing')
+
+
+def _source_path(table_name, year, season, store_dir):
+    return os.path.join(partition_dir(table_name, year, season, store_dir), 'source')
+
+
+def _stored_source(table_name, year, season, store_dir):
+    """
+    Returns the archive_url the partition was converted from, or None.
+    """
+    try:
+        with open(_source_path(table_name, year, season, store_dir)) as source_file:
+            return source_file.read().strip()
+    except OSError:
+        return None
+
+
+def _lock_path(table_name, year, season, store_dir):
+    return os.path.join(partition_dir(table_name, year, season, store_dir), 'lock')
+
+
+def _is_stored(table_name, year, season, store_dir, zip_url):
+    if _stored_source(table_name, year, season, store_dir) != zip_url:
+        return False
+    return os.path.exists(_data_path(table_name, year, season, store_dir)) or \
+        os.path.exists(_missing_path(table_name, year, season, store_dir))
+
+
+def _write_parquet(df, path):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, engine='pyarrow', compression=COMPRESSION, row_group_size=ROW_GROUP_SIZE,
+                      write_statistics=True, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_table(df, table_name, year, season, store_dir=STORE_DIR):
+    """
+    Writes one table partition, replacing any existing one atomically.
+    Concurrent writers of the same partition take turns.
+    """
+    os.makedirs(partition_dir(table_name, year, season, store_dir), exist_ok=True)
+    with locked(_lock_path(table_name, year, season, store_dir)):
+        _write_parquet(df, _data_path(table_name, year, season, store_dir))
+
+
+def ingest(year, season, table_names, store_dir=STORE_DIR, force=False):
+    """
+    Converts the given tables of a season's feed to Parquet. Tables already
+    converted from the archive the catalog lists for the season are skipped
+    unless force is set. Returns False if the catalog has no feed for it.
+    """
+    zip_url = find_feed_url(year, season)
+    if zip_url is None:
+        return False
+    pending = [table_name for table_name in table_names
+               if force or not _is_stored(table_name, year, season, store_dir, zip_url)]
+    if not pending:
+        return True
+
+    # small tables come over Range requests; for stop_times or shapes the whole
+    # archive is streamed into the archive cache first (see feed_tables.LARGE_TABLES)
+    with feed_tables.extract_tables(zip_url, pending, remote=True) as tables:
+        for table_name in pending:
+            os.makedirs(partition_dir(table_name, year, season, store_dir), exist_ok=True)
+            with locked(_lock_path(table_name, year, season, store_dir)):
+                # another thread or process may have converted it meanwhile
+                if not force and _is_stored(table_name, year, season, store_dir, zip_url):
+                    continue
+                data_path = _data_path(table_name, year, season, store_dir)
+                missing_path = _missing_path(table_name, year, season, store_dir)
+                if table_name in tables:
+                    # read, not tables[...], so each table is freed once it is written
+                    _write_parquet(tables.read(table_name), data_path)
+                    if os.path.exists(missing_path):
+                        os.remove(missing_path)
+                else:
+                    open(missing_path, 'w').close()
+                    if os.path.exists(data_path):
+                        os.remove(data_path)
+                # written last, a partition interrupted before this is converted again
+                atomic_write(_source_path(table_name, year, season, store_dir), zip_url, mode='w')
+    return True
+
+
+def load_tables(year, season, table_names, columns=None, store_dir=STORE_DIR):
+    """
+    Returns a dict of table name -> DataFrame for one season, ingesting the
+    tables first if needed. Tables missing from the feed are left out, and
+    columns optionally maps a table name to the only columns to read.
+    """
+    columns = columns or {}
+    if not ingest(year, season, table_names, store_dir):
+        return {}
+    tables = {}
+    for table_name in table_names:
+        path = _data_path(table_name, year, season, store_dir)
+        if not os.path.exists(path):
+            continue
+        wanted = columns.get(table_name)
+        if wanted is not None:
+            available = set(pq.read_schema(path).names)
+            wanted = [column for column in wanted if column in available]
+        tables[table_name] = pd.read_parquet(path, columns=wanted)
+    return tables
+
@@ -0,0 +1,100 @@
+# Reads GTFS tables out of a feed archive.
+#
+# extract_tables opens an archive once and returns a FeedTables mapping of the
+# requested tables. Each table is parsed the first time it is accessed, so a
+# caller only pays for the tables it actually uses and never reopens the ZIP
+# to get the next one.
+
+import hashlib
+import os
+from collections.abc import Mapping
+
+import pandas as pd
+
+import archive_cache
+import gtfs_schema
+import remote_zip
+
+CHUNK_SIZE = 1024 ** 2
+# members too large to pull into memory over a Range request; archives holding
+# them are streamed to disk by the archive cache instead
+LARGE_TABLES = {'stop_times', 'shapes'}
+
+
+class FeedTables(Mapping):
+    """
+    Read-only mapping of table name -> DataFrame backed by one open archive.
+    Tables missing from the feed are simply not in the mapping. Tables are
+    parsed with the dtypes from gtfs_schema, and columns maps a table name to
+    the only columns that should be read from it.
+    """
+
+    def __init__(self, zip_file, table_names=None, columns=None):
+        self._zip_file = zip_file
+        self._columns = columns or {}
+        self._members = {}
+        for file_info in zip_file.infolist():
+            table_name, extension = os.path.splitext(file_info.filename)
+            if extension == '.txt' and (table_names is None or table_name in table_names):
+                self._members[table_name] = file_info.filename
+        self._tables = {}
+
+    def __getitem__(self, table_name):
+        if table_name not in self._tables:
+            self._tables[table_name] = self.read(table_name)
+        return self._tables[table_name]
+
+    def read(self, table_name):
+        """
+        Parses a table without keeping it, for callers that only need each
+        table once and want it freed as soon as they drop it.
+        """
+        member = self._members[table_name]
+        with self._zip_file.open(member) as file:
+            return pd.read_csv(file, **gtfs_schema.read_options(table_name, self._columns.get(table_name)))
+
+    def content_hash(self, table_name):
+        """
+        Returns the sha256 hex digest of the table's file in the archive.
+        """
+        digest = hashlib.sha256()
+        with self._zip_file.open(self._members[table_name]) as file:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def __contains__(self, table_name):
+        # Mapping's default would parse the table just to test for it
+        return table_name in self._members
+
+    def __iter__(self):
+        return iter(self._members)
+
+    def __len__(self):
+        return len(self._members)
+
+    def close(self):
+        self._zip_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def extract_tables(zip_url, table_names=None, remote=False, columns=None):
+    """
+    Opens the archive at zip_url once and returns a lazily parsed FeedTables
+    mapping of table_names (all .txt tables in the feed if None), optionally
+    pruned to the given columns per table.
+
+    With remote=True an archive that is not cached yet is read with HTTP Range
+    requests, so only the requested members are transferred. This is the
+    cheaper choice for small tables such as stops, routes or fare_products;
+    each member is fetched into memory in one request, so it is not used when
+    table_names is None or holds any of LARGE_TABLES.
+    """
+    if remote and table_names is not None and LARGE_TABLES.isdisjoint(table_names):
+        return FeedTables(remote_zip.open_archive(zip_url), table_names, columns)
+    return FeedTables(archive_cache.open_archive(zip_url), table_names, columns)
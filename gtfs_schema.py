@@ -0,0 +1,163 @@
+# Column types for the GTFS tables in the MBTA archives.
+#
+# pd.read_csv on its own infers every column, which leaves ids as object
+# columns and small flags as int64 / float64. TABLES lists the known columns of
+# each table with a compact dtype: ids that repeat a lot (route_id, stop_id,
+# service_id, ...) are categories, sequences are int32 and flags are int8
+# (nullable Int8 where the column may be empty). Times and dates stay strings
+# and are parsed by the analyses that need them; DATE_COLUMNS and TIME_COLUMNS
+# name them for the loaders that store them typed.
+
+CATEGORY = 'category'
+
+# YYYYMMDD service dates and HH:MM:SS service-day times (may be past 24:00)
+DATE_COLUMNS = {'start_date', 'end_date', 'date', 'feed_start_date', 'feed_end_date'}
+TIME_COLUMNS = {'arrival_time', 'departure_time', 'start_time', 'end_time'}
+
+TABLES = {
+    'calendar': {
+        'service_id': CATEGORY,
+        'monday': 'int8',
+        'tuesday': 'int8',
+        'wednesday': 'int8',
+        'thursday': 'int8',
+        'friday': 'int8',
+        'saturday': 'int8',
+        'sunday': 'int8',
+        'start_date': str,
+        'end_date': str,
+    },
+    'calendar_dates': {
+        'service_id': CATEGORY,
+        'date': str,
+        'exception_type': 'int8',
+        'holiday_name': str,
+    },
+    'fare_leg_rules': {
+        'leg_group_id': str,
+        'network_id': CATEGORY,
+        'from_area_id': str,
+        'to_area_id': str,
+        'from_timeframe_group_id': str,
+        'to_timeframe_group_id': str,
+        'fare_product_id': str,
+        'transfer_only': 'Int8',
+    },
+    'fare_products': {
+        'fare_product_id': str,
+        'fare_product_name': str,
+        'fare_media_id': str,
+        'amount': 'float64',
+        'currency': str,
+    },
+    'feed_info': {
+        'feed_publisher_name': str,
+        'feed_publisher_url': str,
+        'feed_lang': str,
+        'default_lang': str,
+        'feed_start_date': str,
+        'feed_end_date': str,
+        'feed_version': str,
+        'feed_contact_email': str,
+        'feed_contact_url': str,
+        'feed_id': str,
+    },
+    'lines': {
+        'line_id': CATEGORY,
+        'line_short_name': str,
+        'line_long_name': str,
+        'line_desc': str,
+        'line_url': str,
+        'line_color': str,
+        'line_text_color': str,
+        'line_sort_order': 'Int32',
+    },
+    'routes': {
+        'route_id': CATEGORY,
+        'agency_id': CATEGORY,
+        'route_short_name': str,
+        'route_long_name': str,
+        'route_desc': str,
+        'route_type': 'Int8',
+        'route_url': str,
+        'route_color': str,
+        'route_text_color': str,
+        'route_sort_order': 'Int32',
+        'route_fare_class': str,
+        'line_id': CATEGORY,
+        'listed_route': 'Int8',
+        'network_id': CATEGORY,
+    },
+    'shapes': {
+        'shape_id': CATEGORY,
+        'shape_pt_lat': 'float64',
+        'shape_pt_lon': 'float64',
+        'shape_pt_sequence': 'int32',
+        'shape_dist_traveled': 'float64',
+    },
+    'stop_times': {
+        'trip_id': str,
+        'arrival_time': str,
+        'departure_time': str,
+        'stop_id': CATEGORY,
+        'stop_sequence': 'int32',
+        'stop_headsign': str,
+        'pickup_type': 'Int8',
+        'drop_off_type': 'Int8',
+        'timepoint': 'Int8',
+        'checkpoint_id': CATEGORY,
+        'continuous_pickup': 'Int8',
+        'continuous_drop_off': 'Int8',
+    },
+    'stops': {
+        'stop_id': CATEGORY,
+        'stop_code': str,
+        'stop_name': str,
+        'stop_desc': str,
+        'platform_code': str,
+        'platform_name': str,
+        'stop_lat': 'float64',
+        'stop_lon': 'float64',
+        'zone_id': str,
+        'stop_address': str,
+        'stop_url': str,
+        'level_id': str,
+        'location_type': 'Int8',
+        'parent_station': str,
+        'wheelchair_boarding': 'Int8',
+        'municipality': str,
+        'on_street': str,
+        'at_street': str,
+        'vehicle_type': 'Int8',
+    },
+    'trips': {
+        'route_id': CATEGORY,
+        'service_id': CATEGORY,
+        'trip_id': str,
+        'trip_headsign': str,
+        'trip_short_name': str,
+        'direction_id': 'Int8',
+        'block_id': str,
+        'shape_id': str,
+        'wheelchair_accessible': 'Int8',
+        'trip_route_type': 'Int8',
+        'route_pattern_id': str,
+        'bikes_allowed': 'Int8',
+    },
+}
+
+
+def read_options(table_name, columns=None):
+    """
+    Returns the pd.read_csv keyword arguments for a GTFS table: the dtype map
+    and, if columns is given, a usecols filter so only those columns are parsed.
+    Columns the registry does not know are left to pandas to infer.
+    """
+    dtypes = TABLES.get(table_name, {})
+    if columns is None:
+        return {'dtype': dtypes}
+    columns = set(columns)
+    return {
+        'usecols': lambda column: column in columns,
+        'dtype': {column: dtype for column, dtype in dtypes.items() if column in columns},
+    }
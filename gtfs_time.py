@@ -0,0 +1,133 @@
+# Vectorized parsing of GTFS stop times.
+#
+# GTFS times are HH:MM:SS measured from "noon minus 12h" of the service day,
+# so trips running past midnight have hours of 24 and above (25:10:00 is
+# 1:10 AM the next morning on the same service day). pd.to_datetime rejects
+# those and parsing cell by cell in Python dominates the cost of stop_times.
+# parse_times converts a whole column at once into int32 seconds since
+# service-day midnight, keeping times past 24:00 as they are, time_periods
+# bins those seconds into named periods of the day and trip_extents reduces
+# stop times to the first departure and last arrival of each trip.
+
+import numpy as np
+import pandas as pd
+
+INVALID = -1
+DAY = 24 * 3600
+
+# (label, start hour) of each period, in order through the day. The last
+# period runs until the first one starts again the next morning.
+SERVICE_PERIODS = [
+    ('Sunrise', 3),
+    ('Early AM', 6),
+    ('AM Peak', 7),
+    ('Midday Base', 9),
+    ('Midday School', 13.5),
+    ('PM Peak', 16),
+    ('Evening', 18.5),
+    ('Late Evening', 22),
+    ('Night', 24),
+]
+_WIDTH = 8  # HH:MM:SS
+_DIGITS = [0, 1, 3, 4, 6, 7]
+_COLONS = [2, 5]
+
+
+def parse_times(times):
+    """
+    Parses a Series of GTFS times (HH:MM:SS, or H:MM:SS for hours below 10)
+    into seconds since service-day midnight. Returns (seconds, valid): an int32
+    Series with INVALID where the time is missing or malformed, and the
+    boolean validity mask, both on the index of times.
+    """
+    text = times.astype('string').str.strip().str.zfill(_WIDTH)
+    fits = ((text.str.len() == _WIDTH) & text.str.isascii()).fillna(False).to_numpy(dtype=bool)
+    text = text.where(fits, '')
+
+    # view each time as a row of 8 ASCII bytes and check the layout in one go
+    raw = text.to_numpy(dtype=object).astype(f'S{_WIDTH}')
+    chars = np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(len(raw), _WIDTH)
+    digits = chars[:, _DIGITS].astype(np.int32) - ord('0')
+    valid = fits & (chars[:, _COLONS] == ord(':')).all(axis=1) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    valid &= (digits[:, 2] <= 5) & (digits[:, 4] <= 5)
+
+    seconds = (digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 2] * 10 + digits[:, 3]) * 60 \
+        + digits[:, 4] * 10 + digits[:, 5]
+    seconds = np.where(valid, seconds, INVALID).astype(np.int32)
+    return pd.Series(seconds, index=times.index, name=times.name), pd.Series(valid, index=times.index, name=times.name)
+
+
+def parse_time_columns(df, columns=('arrival_time', 'departure_time')):
+    """
+    Adds an int32 seconds column for each time column of df (arrival_time ->
+    arrival_seconds) and returns df without the rows where any of them is
+    missing or malformed.
+    """
+    all_valid = pd.Series(True, index=df.index)
+    parsed = {}
+    for column in columns:
+        seconds, valid = parse_times(df[column])
+        parsed[column.replace('_time', '_seconds')] = seconds
+        all_valid &= valid
+    df = df.assign(**parsed)
+    return df[all_valid]
+
+
+def time_periods(seconds, periods=SERVICE_PERIODS):
+    """
+    Bins seconds since service-day midnight into the given periods and returns
+    an ordered categorical Series with the period labels in the order of the
+    day. Times past 24:00 fall into the early morning periods and INVALID
+    times are left missing.
+    """
+    labels = [label for label, _ in periods]
+    starts = np.array([start * 3600 for _, start in periods])
+    values = np.asarray(seconds)
+
+    # shift the day so it starts with the first period, then one binary search per value
+    day_seconds = (values - starts[0]) % DAY + starts[0]
+    codes = np.searchsorted(starts, day_seconds, side='right') - 1
+    codes[values < 0] = -1
+
+    # a label may name more than one range (e.g. night before and after midnight)
+    categories = list(dict.fromkeys(labels))
+    label_codes = np.array([categories.index(label) for label in labels] + [-1])
+    categorical = pd.Categorical.from_codes(label_codes[codes], categories=categories, ordered=True)
+    return pd.Series(categorical, index=getattr(seconds, 'index', None), name='time_period')
+
+
+def trip_extents(stop_times, carry=()):
+    """
+    Returns one row per trip_id with the first departure, last arrival,
+    duration (all in seconds) and number of stops, ordered by stop_sequence
+    rather than by row order. stop_times needs arrival_seconds and
+    departure_seconds (see parse_time_columns); the columns in carry are taken
+    from each trip's first stop.
+    """
+    if len(stop_times) == 0:
+        # the run detection below would turn no rows into one trip
+        extents = stop_times[['trip_id', *carry]].reset_index(drop=True)
+        extents['first_departure'] = stop_times['departure_seconds'].to_numpy()
+        extents['last_arrival'] = stop_times['arrival_seconds'].to_numpy()
+        extents['duration'] = extents['last_arrival'] - extents['first_departure']
+        extents['stop_count'] = np.zeros(0, dtype=np.int32)
+        return extents
+
+    trip_codes, trip_ids = pd.factorize(stop_times['trip_id'])
+    order = np.lexsort((stop_times['stop_sequence'].to_numpy(), trip_codes))
+    trip_codes = trip_codes[order]
+
+    # each trip is one run of the sorted codes
+    starts = np.flatnonzero(np.r_[True, trip_codes[1:] != trip_codes[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    first_departure = stop_times['departure_seconds'].to_numpy()[order[starts]]
+    last_arrival = stop_times['arrival_seconds'].to_numpy()[order[ends]]
+
+    extents = pd.DataFrame({'trip_id': trip_ids[trip_codes[starts]]})
+    for column in carry:
+        extents[column] = stop_times[column].iloc[order[starts]].to_numpy()
+    extents['first_departure'] = first_departure
+    extents['last_arrival'] = last_arrival
+    extents['duration'] = last_arrival - first_departure
+    extents['stop_count'] = (ends - starts + 1).astype(np.int32)
+    return extents
@@ -0,0 +1,71 @@
+# Shared HTTP layer for talking to the MBTA archive.
+#
+# All requests go through one requests.Session, so connections to the CDN are
+# pooled and reused instead of being opened for every archive. Failed requests
+# (connection errors, 429 and 5xx responses) are retried with exponential
+# backoff, and the number of requests in flight against a single host is
+# capped so parallel downloads do not hammer the server.
+
+import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+MAX_PER_HOST = int(os.environ.get('MBTA_MAX_PER_HOST', 4))
+POOL_SIZE = int(os.environ.get('MBTA_HTTP_POOL_SIZE', 16))
+RETRIES = Retry(
+    total=5,
+    backoff_factor=0.5,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=['GET', 'HEAD'],
+)
+
+_session = None
+_session_lock = threading.Lock()
+_host_slots = {}
+
+
+def get_session():
+    """
+    Returns the process-wide pooled session, creating it on first use.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=RETRIES)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+    return _session
+
+
+def _host_slot(url):
+    host = urlsplit(url).netloc
+    with _session_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(MAX_PER_HOST)
+        return _host_slots[host]
+
+
+def get(url, **kwargs):
+    """
+    GETs url through the shared session, waiting for a free per-host slot.
+    """
+    with _host_slot(url):
+        return get_session().get(url, **kwargs)
+
+
+@contextmanager
+def stream(url, **kwargs):
+    """
+    Streams url through the shared session. The per-host slot is held until
+    the caller is done reading the body.
+    """
+    with _host_slot(url):
+        with get_session().get(url, stream=True, **kwargs) as response:
+            yield response
@@ -0,0 +1,86 @@
+# Record of the feed tables already loaded into BigQuery.
+#
+# Every successful load appends a line to a JSON lines file naming the
+# destination table, the feed it came from (year, season and archive_url) and
+# the content hash and row count of the GTFS table. The pipeline looks its
+# feeds up here on the next run: a feed loaded from the same archive is
+# skipped without downloading it, and of a new or changed feed only the tables
+# whose content differs from what was loaded before are uploaded again.
+# Lines are only ever appended, the last one for a table and feed wins.
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+MANIFEST_PATH = os.environ.get('MBTA_LOAD_MANIFEST', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'load_manifest.jsonl'))
+
+
+class LoadManifest:
+    """
+    The loads recorded in the JSON lines file at path, keyed by
+    (destination, year, season) where destination is "project.dataset.table".
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[(entry['destination'], entry['year'], entry['season'])] = entry
+
+    def get(self, destination, year, season):
+        return self._entries.get((destination, year, season))
+
+    def entries(self, destination, year, season=None):
+        """
+        Returns the entries of a destination table for a year, or for one
+        season of it.
+        """
+        return [entry for (dest, entry_year, entry_season), entry in self._entries.items()
+                if dest == destination and entry_year == year and season in (None, entry_season)]
+
+    def record(self, destination, year, season, archive_url, content_hash, rows, feed_tables):
+        """
+        Records that the table of the feed at archive_url now in destination
+        has the given content hash and row count. feed_tables are the names of
+        all the tables of that feed.
+        """
+        entry = {
+            'destination': destination,
+            'year': year,
+            'season': season,
+            'archive_url': archive_url,
+            'table': destination.rsplit('.', 1)[-1],
+            'content_hash': content_hash,
+            'rows': rows,
+            'feed_tables': sorted(feed_tables),
+            'loaded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+        with self._lock:
+            with open(self.path, 'a') as file:
+                file.write(json.dumps(entry) + '\n')
+            self._entries[(destination, year, season)] = entry
+
+    def is_current(self, destination, year, season, content_hash):
+        """
+        Returns whether the table with this content hash is what was last
+        loaded into destination for the feed.
+        """
+        entry = self.get(destination, year, season)
+        return entry is not None and entry['content_hash'] == content_hash
+
+    def feed_loaded(self, dataset, year, season, archive_url):
+        """
+        Returns whether every table of the feed at archive_url was loaded into
+        dataset ("project.dataset") for year and season.
+        """
+        entries = {entry['table']: entry for (dest, entry_year, entry_season), entry in self._entries.items()
+                   if dest.rsplit('.', 1)[0] == dataset and entry_year == year and entry_season == season}
+        feed_entries = [entry for entry in entries.values() if entry['archive_url'] == archive_url]
+        return bool(feed_entries) and all(table_name in entries and entries[table_name]['archive_url'] == archive_url
+                                          for table_name in feed_entries[0]['feed_tables'])
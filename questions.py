@@ -0,0 +1,230 @@
+# The base questions as a graph of analysis steps.
+#
+# Every step lists the steps whose results it takes, and a question's table is
+# the result of the step named after it, so q5 and q7 share the schedule step
+# and q6 builds on the cleaned trips. INPUTS lists the (years, seasons, tables)
+# each question reads from the feed store: ingest_inputs converts every feed
+# the chosen questions need once, opening each archive a single time, and run
+# then executes only the steps those questions depend on, independent ones in
+# parallel, handing each table back as soon as it is ready. The steps all read
+# their tables from one shared FeedSet, so a table several questions use is
+# held in memory once and stays under a single memory budget.
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+import archive_cache
+import feed_store
+from feed_catalog import find_feed_url, full_year
+from feed_set import FeedSet, MEMORY_BUDGET
+from feed_tables import LARGE_TABLES
+
+QUESTION_NUMS = ['q1', 'q2', 'q3', 'q4', 'q5', 'q6', 'q7']
+SEASONS = ['Spring', 'Summer', 'Fall', 'Winter']
+YEARS = [2019, 2020, 2021, 2022, 2023, 2024]
+MAX_WORKERS = int(os.environ.get('MBTA_QUESTION_WORKERS', 4))
+
+INPUTS = {
+    'q1': (YEARS, SEASONS, ['lines', 'routes', 'trips', 'calendar', 'stop_times']),
+    'q2': (YEARS, SEASONS, ['lines', 'routes', 'trips', 'calendar', 'stop_times']),
+    'q3': ([2021, 2022, 2023, 2024], SEASONS, ['stops']),
+    'q4': ([2023, 2024], SEASONS, ['fare_products', 'fare_leg_rules', 'routes']),
+    'q5': (YEARS, SEASONS, ['trips', 'calendar', 'stop_times', 'routes']),
+    'q6': (YEARS, SEASONS, ['trips']),
+    'q7': (YEARS, SEASONS, ['trips', 'calendar', 'stop_times', 'routes']),
+}
+
+
+def load_question_tables(table_names, years, seasons, feeds):
+    # the tables the question needs, from the shared FeedSet
+    table_args = {}
+    for year in years:
+        for season in seasons:
+            for table in table_names:
+                df = feeds.get(year, season, table)
+                if df is None:
+                    print(f'Table {table} not found for {season} {year}')
+                    continue
+                table_args[f'{table}_{year}_{season}'] = df
+    return table_args
+
+
+def _trip_counts(feeds):
+    from analysis_scripts import TripCount_TimeOfDay
+    return TripCount_TimeOfDay.get_tripcount_weekday([year % 100 for year in INPUTS['q1'][0]], feeds=feeds)
+
+
+def _express_trains(feeds):
+    from analysis_scripts import Q2_ExpressScript
+    return Q2_ExpressScript.get_express_average_per_year([year % 100 for year in INPUTS['q2'][0]], SEASONS, feeds=feeds)
+
+
+def _fare_zones(feeds):
+    from analysis_scripts import fare_zone_change
+    years, seasons, table_names = INPUTS['q3']
+    return fare_zone_change.final_table(load_question_tables(table_names, years, seasons, feeds))
+
+
+def _fare_costs(feeds):
+    from analysis_scripts import farecost
+    years, seasons, table_names = INPUTS['q4']
+    return farecost.main(load_question_tables(table_names, years, seasons, feeds))
+
+
+def _schedule(feeds):
+    from analysis_scripts import schedule
+    return schedule.main(feeds=feeds)
+
+
+def _cleaned_trips(feeds):
+    from analysis_scripts import Net_num_of_trains
+    return Net_num_of_trains.main(feeds=feeds)
+
+
+def _net_trains(feeds, cleaned_trips):
+    from analysis_scripts import Net_num_of_trains
+    return Net_num_of_trains.get_net_trains_per_line(cleaned_trips)
+
+
+# step name -> (names of the steps it takes the results of, function); every
+# function is called with the shared FeedSet followed by those results
+STEPS = {
+    'q1': ([], _trip_counts),
+    'q2': ([], _express_trains),
+    'q3': ([], _fare_zones),
+    'q4': ([], _fare_costs),
+    'q5': ([], _schedule),
+    'q6': (['cleaned_trips'], _net_trains),
+    'q7': (['q5'], lambda feeds, schedule_table: schedule_table),  # q5 and q7 are answered by the same table
+    'cleaned_trips': ([], _cleaned_trips),
+}
+
+
+def needed_feeds(question_nums):
+    """
+    Returns {(year, season): table names} of every feed the questions read.
+    """
+    feeds = {}
+    for question_num in question_nums:
+        years, seasons, table_names = INPUTS[question_num]
+        for year in years:
+            for season in seasons:
+                feeds.setdefault((full_year(year), season), set()).update(table_names)
+    return feeds
+
+
+def ingest_inputs(question_nums, max_workers=MAX_WORKERS):
+    """
+    Converts the tables of every feed the questions read into the feed store,
+    each feed in one go. Archives with stop times or shapes are downloaded
+    whole, in parallel, the small tables of the other feeds come over Range
+    requests. A feed that fails is reported and left out of the returned
+    {(year, season): table names}, so the questions can still run on the rest.
+    """
+    feeds = needed_feeds(question_nums)
+    zip_urls = {feed: find_feed_url(*feed) for feed in feeds}
+    archive_cache.prefetch([zip_url for feed, zip_url in zip_urls.items()
+                            if zip_url is not None and not LARGE_TABLES.isdisjoint(feeds[feed])], max_workers=max_workers)
+    ingested = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(feed_store.ingest, *feed, sorted(table_names)): feed
+                   for feed, table_names in feeds.items()}
+        for future in as_completed(futures):
+            year, season = futures[future]
+            try:
+                if future.result():
+                    ingested[year, season] = feeds[year, season]
+            except Exception as e:
+                print(f'Feed not available for {season} {year}: {e}')
+    return ingested
+
+
+def open_feeds(question_nums, memory_budget=MEMORY_BUDGET):
+    """
+    Returns one FeedSet over every table the questions read. Lines and stop
+    times are prepared the way the trip count analysis needs them, which is a
+    superset of what the other analyses read.
+    """
+    from analysis_scripts import TripCount_TimeOfDay
+    feeds = needed_feeds(question_nums)
+    years = sorted({year for year, _ in feeds})
+    table_names = sorted(set().union(*feeds.values()))
+    prepare = {'lines': TripCount_TimeOfDay.prepare_lines, 'stop_times': TripCount_TimeOfDay.prepare_stop_times}
+    return FeedSet(years, SEASONS, table_names, prepare=prepare, memory_budget=memory_budget)
+
+
+def _closure(step_names):
+    needed = []
+    for step_name in step_names:
+        for dependency in STEPS[step_name][0]:
+            needed += [step for step in _closure([dependency]) if step not in needed]
+        if step_name not in needed:
+            needed.append(step_name)
+    return needed
+
+
+def run(question_nums, max_workers=MAX_WORKERS, on_result=None, feeds=None):
+    """
+    Runs the steps the questions depend on and returns {question: table}.
+    Steps whose dependencies are done run in parallel, and on_result(question,
+    table) is called in the calling thread as each question's table is ready.
+    A failed step is reported, and the questions depending on it are left out.
+    The steps share feeds, by default a new open_feeds(question_nums).
+    """
+    if feeds is None:
+        feeds = open_feeds(question_nums)
+    steps = _closure(question_nums)
+    results, done, failed, running = {}, set(), set(), {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            for step in steps:
+                dependencies, function = STEPS[step]
+                if step in done or step in failed or step in running.values():
+                    continue
+                if any(dependency in failed for dependency in dependencies):
+                    failed.add(step)
+                    print(f'Skipping {step}, a step it needs failed.')
+                elif all(dependency in results for dependency in dependencies):
+                    running[executor.submit(function, feeds, *[results[dependency] for dependency in dependencies])] = step
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step = running.pop(future)
+                try:
+                    results[step] = future.result()
+                except Exception as e:
+                    failed.add(step)
+                    print(f'{step} failed: {e}')
+                    continue
+                done.add(step)
+                if step in question_nums and on_result is not None:
+                    on_result(step, results[step])
+                # intermediate results are dropped once every step using them is done
+                for dependency in STEPS[step][0]:
+                    users = [user for user in steps if dependency in STEPS[user][0]]
+                    if dependency not in question_nums and all(user in done or user in failed for user in users):
+                        results.pop(dependency, None)
+    return {question_num: results[question_num] for question_num in question_nums if question_num in results}
+
+
+def plot(question_num, table):
+    """
+    Returns the figure of a question's table, or None if it has none.
+    """
+    if question_num == 'q1':
+        from analysis_scripts import TripCount_TimeOfDay
+        return TripCount_TimeOfDay.get_plot(table)
+    if question_num == 'q2':
+        from analysis_scripts import Q2_ExpressScript
+        return Q2_ExpressScript.plot_express(table)
+    if question_num == 'q3':
+        from analysis_scripts import fare_zone_change
+        return fare_zone_change.plot_heatmap(table)
+    if question_num == 'q5' or question_num == 'q7':
+        from analysis_scripts import schedule
+        return schedule.plot_all_routes_chronological(table)
+    if question_num == 'q6':
+        from analysis_scripts import Net_num_of_trains
+        return Net_num_of_trains.plot_net_trains(table)
+    return None
@@ -0,0 +1,134 @@
+# Reads individual members of a remote ZIP archive with HTTP Range requests.
+#
+# A GTFS archive is dominated by stop_times.txt and shapes.txt, but most
+# questions only need a few small tables. RemoteFile is a seekable file object
+# over an archive URL: it fetches the tail of the archive (end of central
+# directory + central directory) in one request, and zipfile then only pulls
+# the byte ranges of the members that are actually opened. Servers that ignore
+# Range fall back to downloading the whole archive into the archive cache.
+
+import io
+import re
+import zipfile
+
+import archive_cache
+import http_session
+
+TAIL_SIZE = 64 * 1024  # enough for the EOCD record and a GTFS central directory
+READAHEAD = 256 * 1024
+LOCAL_HEADER_SLACK = 1024  # local extra fields may be longer than the central ones
+
+stats = {'requests': 0, 'bytes': 0, 'fallbacks': 0}
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+def _fetch_range(url, range_header):
+    """
+    Returns (content, total size) of a Range request, or raises
+    RangeNotSupported if the server answered with the whole resource.
+    """
+    with http_session.stream(url, headers={'Range': range_header}) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise RangeNotSupported(url)
+        match = re.match(r'bytes \d+-\d+/(\d+)', response.headers.get('Content-Range', ''))
+        if match is None:
+            raise RangeNotSupported(url)
+        content = response.content
+    stats['requests'] += 1
+    stats['bytes'] += len(content)
+    return content, int(match.group(1))
+
+
+class RemoteFile(io.RawIOBase):
+    """
+    Read-only, seekable view of a remote file backed by Range requests.
+    Keeps a single buffer holding the most recently fetched range.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        tail, self.size = _fetch_range(url, f'bytes=-{TAIL_SIZE}')
+        self._buffer_start = self.size - len(tail)
+        self._buffer = tail
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = self.size + offset
+        return self._pos
+
+    def load(self, start, end):
+        """
+        Fetches bytes [start, end) into the buffer with a single request.
+        """
+        end = min(end, self.size)
+        if self._buffer_start <= start and end <= self._buffer_start + len(self._buffer):
+            return
+        self._buffer, _ = _fetch_range(self.url, f'bytes={start}-{end - 1}')
+        self._buffer_start = start
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self._pos
+        size = min(size, self.size - self._pos)
+        if size <= 0:
+            return b''
+        buffer_end = self._buffer_start + len(self._buffer)
+        if not (self._buffer_start <= self._pos and self._pos + size <= buffer_end):
+            self.load(self._pos, self._pos + max(size, READAHEAD))
+        offset = self._pos - self._buffer_start
+        data = self._buffer[offset:offset + size]
+        self._pos += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class RemoteZipFile(zipfile.ZipFile):
+    """
+    ZipFile over a RemoteFile that fetches each member with one request.
+    """
+
+    def open(self, name, mode='r', pwd=None, **kwargs):
+        if mode == 'r':
+            info = name if isinstance(name, zipfile.ZipInfo) else self.getinfo(name)
+            start = info.header_offset
+            header_size = 30 + len(info.orig_filename.encode('utf-8')) + len(info.extra) + LOCAL_HEADER_SLACK
+            self.fp.load(start, start + header_size + info.compress_size)
+        return super().open(name, mode, pwd, **kwargs)
+
+
+def open_archive(archive_url):
+    """
+    Opens archive_url for reading individual members. Uses the cached copy if
+    there is one, Range requests if the server supports them, and otherwise
+    downloads the whole archive into the cache.
+    """
+    cached = archive_cache.cached_path(archive_url)
+    if cached is not None:
+        return zipfile.ZipFile(cached)
+    try:
+        return RemoteZipFile(RemoteFile(archive_url))
+    except RangeNotSupported:
+        stats['fallbacks'] += 1
+        return archive_cache.open_archive(archive_url)
@@ -0,0 +1,76 @@
+# Answers a set of base questions in one process.
+#
+# Instead of one bigquery_cleaned_pipeline.py and one visualizations.py run per
+# question, the feeds all the chosen questions read are converted into the
+# feed store once up front, the analyses run as one dependency graph (see
+# questions.py) and every table is uploaded as soon as it is ready and drawn
+# from the same result, without computing any question twice.
+
+import argparse
+import os
+
+import archive_cache
+import bigquery_load
+import questions
+import sinks
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-q', '--question_num', type=str, nargs='+', default=['all'], choices=questions.QUESTION_NUMS + ['all'], help='questions to answer (all of them by default)')
+parser.add_argument('-p', '--project', type=str, help='BigQuery project ID to upload the tables to; nothing is uploaded without it')
+parser.add_argument('-l', '--local', type=str, help='upload into a local SQLite warehouse in this directory instead of BigQuery')
+parser.add_argument('-c', '--concurrency', type=int, default=bigquery_load.MAX_CONCURRENT_LOADS, help='number of BigQuery load jobs to run at the same time')
+parser.add_argument('-w', '--workers', type=int, default=questions.MAX_WORKERS, help='number of analyses and downloads to run at the same time')
+parser.add_argument('-o', '--output_dir', type=str, default='visualizations', help='directory the figures are saved to')
+parser.add_argument('--no_figures', action='store_true', help='only compute and upload the tables')
+args = parser.parse_args()
+
+
+if __name__ == '__main__':
+    question_nums = questions.QUESTION_NUMS if 'all' in args.question_num else list(dict.fromkeys(args.question_num))
+    dataset_id = "analysis_data"
+
+    feeds = questions.ingest_inputs(question_nums, args.workers)
+    print(f"Feed store ready: {len(feeds)} feeds for {', '.join(question_nums)}.")
+
+    sink = None
+    if args.project:
+        sink = sinks.open_sink(args.project, args.local, args.concurrency)
+        sink.create_dataset(dataset_id)
+
+    def upload(question_num, table_data):
+        if sink is not None:
+            sink.submit(table_data, dataset_id, question_num)
+
+    tables = questions.run(question_nums, args.workers, on_result=upload)
+
+    failed = len(tables) < len(question_nums)
+    if not args.no_figures:
+        import matplotlib.pyplot as plt
+        os.makedirs(args.output_dir, exist_ok=True)
+        for question_num, table_data in tables.items():
+            try:
+                plot = questions.plot(question_num, table_data)
+            except Exception as e:
+                print(f'Visualization for {question_num} failed: {e}')
+                failed = True
+                continue
+            if plot is None:
+                print(f'No visualization available for {question_num}')
+                continue
+            path = os.path.join(args.output_dir, f'{question_num}.png')
+            plot.savefig(path, dpi=300, bbox_inches='tight', pad_inches=0.1)
+            print(f'Visualization for {question_num} saved at {path}')
+            plt.close(plot)
+
+    if sink is not None:
+        try:
+            loaded = sink.wait()
+        except bigquery_load.LoadError as e:
+            loaded, failed = e.loaded, True
+            print(e)
+        for table_ref in loaded:
+            print(f"Uploaded {table_ref.table_id} to BigQuery dataset {dataset_id}.")
+        sink.close()
+    print(f"Archive cache: {archive_cache.cache_stats()}")
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,201 @@
+# Destinations the pipelines upload their tables to.
+#
+# A sink takes typed table loads into a dataset / table layout. BigQuerySink
+# is the real warehouse: one shared client and the concurrent LoadQueue of
+# bigquery_load. LocalSink keeps the same layout in embedded databases on disk
+# (one SQLite file per dataset, or a DuckDB file with MBTA_LOCAL_DUCKDB=1 and
+# duckdb installed) so the ingest and the question exports run with no Google
+# Cloud project or network.
+# Both type the frames with bigquery_load.prepare_table, append to existing
+# tables, add columns that new feeds bring and report failures as LoadError.
+
+import os
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import Future
+
+import bigquery_load
+from bigquery_load import DATE, TIMESTAMP, BOOL, INT64, FLOAT64, STRING
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+USE_DUCKDB = os.environ.get('MBTA_LOCAL_DUCKDB') == '1'
+
+
+class TableId(namedtuple('TableId', ['project', 'dataset_id', 'table_id'])):
+    def __str__(self):
+        return f'{self.project}.{self.dataset_id}.{self.table_id}'
+
+
+class BigQuerySink:
+    """
+    Loads into BigQuery project, at most max_concurrent load jobs at a time.
+    """
+
+    def __init__(self, project, max_concurrent=bigquery_load.MAX_CONCURRENT_LOADS):
+        self.project = project
+        self.client = bigquery_load.bigquery.Client(project=project)
+        self._loads = bigquery_load.LoadQueue(self.client, max_concurrent)
+
+    def create_dataset(self, dataset_id):
+        dataset = bigquery_load.bigquery.Dataset(self.client.dataset(dataset_id))
+        dataset.location = "US"
+        try:
+            self.client.create_dataset(dataset)  # create dataset if it doesn't exist
+        except Exception as e:
+            print(f"Dataset {dataset_id} already exists.")
+
+    def submit(self, df, dataset_id, table_name, partitioned=False):
+        """
+        Starts appending df to dataset_id.table_name and returns its future.
+        partitioned tables are range partitioned by feed and clustered.
+        """
+        if partitioned:
+            job_config = bigquery_load.partitioned_job_config(df.columns)
+        else:
+            job_config = bigquery_load.append_job_config()
+        table_ref = self.client.dataset(dataset_id).table(table_name)
+        return self._loads.submit(df, table_ref, table_name, job_config)
+
+    def delete_feed_rows(self, dataset_id, table_name, year, season=None):
+        bigquery_load.delete_feed_rows(self.client, self.client.dataset(dataset_id).table(table_name), year, season)
+
+    def wait(self):
+        return self._loads.wait()
+
+    def close(self):
+        self._loads.close()
+
+
+SQLITE_TYPES = {INT64: 'INTEGER', FLOAT64: 'REAL', BOOL: 'INTEGER', STRING: 'TEXT', DATE: 'TEXT', TIMESTAMP: 'TEXT'}
+DUCKDB_TYPES = {INT64: 'BIGINT', FLOAT64: 'DOUBLE', BOOL: 'BOOLEAN', STRING: 'VARCHAR', DATE: 'DATE', TIMESTAMP: 'TIMESTAMP'}
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class LocalSink:
+    """
+    Loads into embedded databases under directory/project, one file per
+    dataset holding its tables. Loads run one at a time as they are submitted.
+    The files are SQLite unless use_duckdb is set.
+    """
+
+    def __init__(self, directory, project, use_duckdb=False):
+        if use_duckdb and duckdb is None:
+            raise ImportError('MBTA_LOCAL_DUCKDB is set but duckdb is not installed')
+        self.project = project
+        self.directory = os.path.join(directory, project)
+        self.use_duckdb = use_duckdb
+        self._connections = {}
+        self._pending = []
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _connect(self, dataset_id):
+        if dataset_id not in self._connections:
+            if self.use_duckdb:
+                self._connections[dataset_id] = duckdb.connect(os.path.join(self.directory, f'{dataset_id}.duckdb'))
+            else:
+                self._connections[dataset_id] = sqlite3.connect(os.path.join(self.directory, f'{dataset_id}.sqlite'))
+        return self._connections[dataset_id]
+
+    def _columns(self, con, table_name):
+        if self.use_duckdb:
+            rows = con.execute("SELECT column_name FROM information_schema.columns WHERE table_name = ?", [table_name]).fetchall()
+            return [name for name, in rows]
+        return [row[1] for row in con.execute(f"PRAGMA table_info({_quote(table_name)})").fetchall()]
+
+    def create_dataset(self, dataset_id):
+        self._connect(dataset_id)
+
+    def submit(self, df, dataset_id, table_name, partitioned=False):
+        """
+        Appends df to dataset_id.table_name and returns a finished future.
+        partitioned tables are indexed on the feed and cluster columns instead.
+        """
+        future = Future()
+        try:
+            self._load(df, dataset_id, table_name, partitioned)
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+        self._pending.append((TableId(self.project, dataset_id, table_name), future))
+        return future
+
+    def _load(self, df, dataset_id, table_name, partitioned):
+        df = bigquery_load.prepare_table(df, table_name)
+        types = DUCKDB_TYPES if self.use_duckdb else SQLITE_TYPES
+        column_types = bigquery_load.column_types(df)
+        con = self._connect(dataset_id)
+        table = _quote(table_name)
+
+        existing = self._columns(con, table_name)
+        if not existing:
+            con.execute(f"CREATE TABLE {table} ({', '.join(f'{_quote(c)} {types[t]}' for c, t in column_types)})")
+        for column, field_type in column_types:
+            if existing and column not in existing:
+                con.execute(f"ALTER TABLE {table} ADD COLUMN {_quote(column)} {types[field_type]}")
+        if partitioned:
+            for column in [bigquery_load.PARTITION_FIELD] + bigquery_load.CLUSTER_FIELDS:
+                if column in df.columns:
+                    con.execute(f"CREATE INDEX IF NOT EXISTS {_quote(f'{table_name}_{column}')} ON {table} ({_quote(column)})")
+
+        columns = ', '.join(_quote(column) for column, _ in column_types)
+        if self.use_duckdb:
+            con.register('frame', df)
+            con.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM frame")
+            con.unregister('frame')
+        else:
+            # sqlite3 takes plain Python values: None for missing, ISO text for dates
+            values = df.astype(object).where(df.notna(), None)
+            for column, field_type in column_types:
+                if field_type in (DATE, TIMESTAMP):
+                    values[column] = values[column].map(lambda value: None if value is None else value.isoformat())
+            placeholders = ', '.join('?' * len(column_types))
+            with con:
+                con.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+                                values.itertuples(index=False, name=None))
+
+    def delete_feed_rows(self, dataset_id, table_name, year, season=None):
+        con = self._connect(dataset_id)
+        if not self._columns(con, table_name):
+            return
+        query = f"DELETE FROM {_quote(table_name)} WHERE year = ?"
+        parameters = [year]
+        if season is not None:
+            query += " AND season = ?"
+            parameters.append(season)
+        con.execute(query, parameters)
+        if not self.use_duckdb:
+            con.commit()
+
+    def wait(self):
+        """
+        Returns the tables loaded since the last wait, or raises LoadError
+        listing the failed loads.
+        """
+        pending, self._pending = self._pending, []
+        loaded = [table_id for table_id, future in pending if future.exception() is None]
+        errors = [(table_id, future.exception()) for table_id, future in pending if future.exception() is not None]
+        if errors:
+            raise bigquery_load.LoadError(errors, loaded)
+        return loaded
+
+    def close(self):
+        for con in self._connections.values():
+            con.close()
+        self._connections.clear()
+
+
+def open_sink(project, local_dir=None, max_concurrent=bigquery_load.MAX_CONCURRENT_LOADS, use_duckdb=USE_DUCKDB):
+    """
+    Returns the LocalSink under local_dir if given, the BigQuerySink of
+    project otherwise.
+    """
+    if local_dir:
+        return LocalSink(local_dir, project, use_duckdb)
+    return BigQuerySink(project, max_concurrent)
@@ -0,0 +1,35 @@
+# Shared fixtures: the repo root on sys.path, a throwaway archive cache and a
+# local HTTP server the network code can be pointed at instead of the MBTA CDN.
+
+import os
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# set before the modules are imported, their defaults are read at import time
+os.environ['MBTA_ARCHIVE_CACHE'] = tempfile.mkdtemp(prefix='mbta_archive_cache_')
+
+
+@pytest.fixture
+def serve():
+    """
+    Starts a ThreadingHTTPServer for a handler class on a free local port and
+    returns its base url. Servers are shut down at the end of the test.
+    """
+    servers = []
+
+    def start(handler_class):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_address[1]}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,129 @@
+# Offline stand-in for the parts of google.cloud.bigquery that bigquery_load
+# uses. Tests swap it in for bigquery_load.bigquery; loads are recorded on the
+# client instead of being sent, and every load job takes latency seconds.
+
+import threading
+import time
+
+
+class SchemaField:
+    def __init__(self, name, field_type, mode='NULLABLE'):
+        self.name = name
+        self.field_type = field_type
+        self.mode = mode
+
+
+class SourceFormat:
+    PARQUET = 'PARQUET'
+
+
+class WriteDisposition:
+    WRITE_APPEND = 'WRITE_APPEND'
+
+
+class CreateDisposition:
+    CREATE_IF_NEEDED = 'CREATE_IF_NEEDED'
+
+
+class SchemaUpdateOption:
+    ALLOW_FIELD_ADDITION = 'ALLOW_FIELD_ADDITION'
+
+
+class RangePartitioning:
+    def __init__(self, field=None, range_=None):
+        self.field = field
+        self.range_ = range_
+
+
+class PartitionRange:
+    def __init__(self, start=None, end=None, interval=None):
+        self.start = start
+        self.end = end
+        self.interval = interval
+
+
+class LoadJobConfig:
+    def __init__(self):
+        self.schema = None
+        self.source_format = None
+        self.write_disposition = None
+        self.create_disposition = None
+        self.schema_update_options = None
+        self.range_partitioning = None
+        self.clustering_fields = None
+
+
+class ScalarQueryParameter:
+    def __init__(self, name, type_, value):
+        self.name = name
+        self.type_ = type_
+        self.value = value
+
+
+class QueryJobConfig:
+    def __init__(self, query_parameters=None):
+        self.query_parameters = query_parameters or []
+
+
+class TableReference:
+    def __init__(self, project, dataset_id, table_id):
+        self.project = project
+        self.dataset_id = dataset_id
+        self.table_id = table_id
+
+    def __str__(self):
+        return f'{self.project}.{self.dataset_id}.{self.table_id}'
+
+
+class Job:
+    def __init__(self, latency=0.0, error=None, on_done=None):
+        self.latency = latency
+        self.error = error
+        self.on_done = on_done
+
+    def result(self):
+        try:
+            time.sleep(self.latency)
+        finally:
+            if self.on_done is not None:
+                self.on_done()
+        if self.error is not None:
+            raise self.error
+        return self
+
+
+class Client:
+    """
+    Records every load and query. Loads into the tables named in fail raise
+    when their result is waited for; running and peak count the load jobs
+    in flight.
+    """
+
+    def __init__(self, project='project', latency=0.0, fail=()):
+        self.project = project
+        self.latency = latency
+        self.fail = set(fail)
+        self.loads = []
+        self.queries = []
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def table(self, dataset_id, table_id):
+        return TableReference(self.project, dataset_id, table_id)
+
+    def _load_done(self):
+        with self.lock:
+            self.running -= 1
+
+    def load_table_from_dataframe(self, df, table_ref, job_config=None):
+        with self.lock:
+            self.loads.append((table_ref, df, job_config))
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        error = Exception(f'load of {table_ref} failed') if table_ref.table_id in self.fail else None
+        return Job(self.latency, error, self._load_done)
+
+    def query(self, query, job_config=None):
+        self.queries.append((query, {parameter.name: parameter.value for parameter in job_config.query_parameters}))
+        return Job()
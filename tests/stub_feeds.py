@@ -0,0 +1,16 @@
+# Stand-in for a FeedSet serving tables from a dict, for the analysis tests.
+
+
+class StubFeeds:
+    """
+    Serves tables from a dict keyed by (year, season, table name).
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def get(self, year, season, table_name):
+        return self.tables.get((year, season, table_name))
+
+    def __getitem__(self, key):
+        return self.tables[key]
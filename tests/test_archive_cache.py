@@ -0,0 +1,123 @@
+import io
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+
+import archive_cache
+
+
+def make_zip(content):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('feed_info.txt', content)
+    return buffer.getvalue()
+
+
+class ArchiveServer:
+    """
+    Serves the archives in bodies by path, counting requests per path.
+    """
+
+    def __init__(self, bodies, latency=0.0):
+        self.bodies = bodies
+        self.latency = latency
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests[self.path] = server.requests.get(self.path, 0) + 1
+                time.sleep(server.latency)
+                body = server.bodies[self.path]
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def blobs(cache_dir):
+    return sorted(name for name in os.listdir(os.path.join(cache_dir, 'blobs')) if name.endswith('.zip'))
+
+
+def test_hits_reuse_the_url_index(serve, tmp_path):
+    server = ArchiveServer({'/a.zip': make_zip('a')})
+    base_url = serve(server.handler())
+    cache_dir = str(tmp_path)
+    before = archive_cache.cache_stats()
+
+    assert archive_cache.cached_path(f'{base_url}/a.zip', cache_dir) is None
+    first = archive_cache.get_archive_path(f'{base_url}/a.zip', cache_dir)
+    second = archive_cache.get_archive_path(f'{base_url}/a.zip', cache_dir)
+
+    assert first == second == archive_cache.cached_path(f'{base_url}/a.zip', cache_dir)
+    assert server.requests == {'/a.zip': 1}
+    after = archive_cache.cache_stats()
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] == 2
+    with archive_cache.open_archive(f'{base_url}/a.zip', cache_dir) as archive:
+        assert archive.read('feed_info.txt') == b'a'
+
+
+def test_identical_archives_share_a_blob(serve, tmp_path):
+    body = make_zip('same')
+    server = ArchiveServer({'/a.zip': body, '/b.zip': body, '/c.zip': make_zip('other')})
+    base_url = serve(server.handler())
+    cache_dir = str(tmp_path)
+
+    paths = [archive_cache.get_archive_path(f'{base_url}/{name}', cache_dir) for name in ['a.zip', 'b.zip', 'c.zip']]
+
+    assert paths[0] == paths[1] != paths[2]
+    assert len(blobs(cache_dir)) == 2
+    assert len(os.listdir(os.path.join(cache_dir, 'urls'))) == 3
+
+
+def test_evicts_least_recently_used(serve, tmp_path):
+    bodies = {f'/{name}.zip': make_zip(name * 100) for name in 'abc'}
+    server = ArchiveServer(bodies)
+    base_url = serve(server.handler())
+    cache_dir = str(tmp_path)
+    paths = {name: archive_cache.get_archive_path(f'{base_url}/{name}.zip', cache_dir) for name in 'abc'}
+    # a was used last, b is the oldest
+    for age, name in [(300, 'b'), (200, 'c'), (100, 'a')]:
+        os.utime(paths[name], (time.time() - age, time.time() - age))
+    before = archive_cache.cache_stats()
+
+    sizes = {name: os.path.getsize(path) for name, path in paths.items()}
+    archive_cache.evict(cache_dir, max_bytes=sizes['a'] + sizes['c'])
+
+    assert blobs(cache_dir) == sorted(os.path.basename(paths[name]) for name in 'ac')
+    assert archive_cache.cache_stats()['evictions'] - before['evictions'] == 1
+    # the index entry of the evicted archive is gone, asking again downloads it
+    assert archive_cache.cached_path(f'{base_url}/b.zip', cache_dir) is None
+    archive_cache.get_archive_path(f'{base_url}/b.zip', cache_dir)
+    assert server.requests['/b.zip'] == 2
+
+    # archives in keep stay even if they are the oldest
+    archive_cache.evict(cache_dir, max_bytes=0, keep=(paths['c'],))
+    assert blobs(cache_dir) == [os.path.basename(paths['c'])]
+
+
+def test_concurrent_misses_download_once(serve, tmp_path):
+    server = ArchiveServer({'/a.zip': make_zip('a' * 10000)}, latency=0.2)
+    base_url = serve(server.handler())
+    cache_dir = str(tmp_path)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        paths = list(executor.map(lambda _: archive_cache.get_archive_path(f'{base_url}/a.zip', cache_dir), range(8)))
+
+    assert len(set(paths)) == 1
+    assert server.requests == {'/a.zip': 1}
+    assert len(blobs(cache_dir)) == 1
+    assert not [name for name in os.listdir(os.path.join(cache_dir, 'blobs')) if name.endswith('.tmp')]
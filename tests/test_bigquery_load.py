@@ -0,0 +1,113 @@
+import pandas as pd
+import pytest
+
+import bigquery_load
+import fake_bigquery
+
+
+@pytest.fixture(autouse=True)
+def stand_in_bigquery(monkeypatch):
+    # google-cloud-bigquery is optional, the tests never talk to the real service
+    monkeypatch.setattr(bigquery_load, 'bigquery', fake_bigquery)
+
+
+def frame(rows=3):
+    return pd.DataFrame({'route_id': ['CR-Fairmount'] * rows, 'trip_id': [str(i) for i in range(rows)]})
+
+
+def test_load_queue_caps_concurrent_loads():
+    client = fake_bigquery.Client(latency=0.1)
+    queue = bigquery_load.LoadQueue(client, max_concurrent=3)
+    table_refs = [client.table('dataset', f'table_{i}') for i in range(9)]
+
+    for table_ref in table_refs:
+        queue.submit(frame(), table_ref)
+    loaded = queue.wait()
+    queue.close()
+
+    assert loaded == table_refs
+    assert len(client.loads) == 9
+    assert client.peak == 3
+    assert client.running == 0
+
+
+def test_load_queue_reports_every_failed_load():
+    client = fake_bigquery.Client(fail={'trips', 'stops'})
+    queue = bigquery_load.LoadQueue(client, max_concurrent=2)
+    table_refs = {name: client.table('dataset', name) for name in ['routes', 'trips', 'calendar', 'stops', 'lines']}
+
+    for name, table_ref in table_refs.items():
+        queue.submit(frame(), table_ref, name)
+    with pytest.raises(bigquery_load.LoadError) as error:
+        queue.wait()
+    queue.close()
+
+    assert [table_ref.table_id for table_ref, _ in error.value.errors] == ['trips', 'stops']
+    assert [table_ref.table_id for table_ref in error.value.loaded] == ['routes', 'calendar', 'lines']
+    assert str(error.value).startswith('2 of 5 loads failed:')
+    assert 'project.dataset.trips: load of project.dataset.trips failed' in str(error.value)
+    # the queue is drained, the next wait only covers new loads
+    assert queue.wait() == []
+
+
+def test_loads_are_typed():
+    client = fake_bigquery.Client()
+    trips = pd.DataFrame({'trip_id': ['1', '2'], 'direction_id': ['0', '1']})
+    stop_times = pd.DataFrame({'trip_id': ['1', '1'], 'stop_sequence': ['1', '2'],
+                               'arrival_time': ['08:00:00', '24:30:00']})
+    calendar = pd.DataFrame({'service_id': ['weekday'], 'start_date': ['20240901']})
+
+    for name, df in [('trips', trips), ('stop_times', stop_times), ('calendar', calendar)]:
+        bigquery_load.load_dataframe(client, df, client.table('dataset', name), name)
+
+    schemas = {table_ref.table_id: {field.name: field.field_type for field in job_config.schema}
+               for table_ref, _, job_config in client.loads}
+    assert schemas['trips'] == {'trip_id': 'STRING', 'direction_id': 'INT64'}
+    assert schemas['stop_times'] == {'trip_id': 'STRING', 'stop_sequence': 'INT64',
+                                     'arrival_time': 'STRING', 'arrival_seconds': 'INT64'}
+    assert schemas['calendar'] == {'service_id': 'STRING', 'start_date': 'DATE'}
+    assert client.loads[1][1]['arrival_seconds'].tolist() == [8 * 3600, 24 * 3600 + 30 * 60]
+    assert all(job_config.source_format == 'PARQUET' for _, _, job_config in client.loads)
+
+
+def test_append_job_config():
+    job_config = bigquery_load.append_job_config()
+
+    assert job_config.write_disposition == 'WRITE_APPEND'
+    assert job_config.create_disposition == 'CREATE_IF_NEEDED'
+    assert job_config.schema_update_options == ['ALLOW_FIELD_ADDITION']
+    assert job_config.range_partitioning is None
+
+
+@pytest.mark.parametrize('columns, clustering_fields', [
+    (['feed_partition', 'route_id', 'trip_id', 'stop_id'], ['route_id', 'trip_id']),
+    (['feed_partition', 'route_id'], ['route_id']),
+    (['feed_partition', 'stop_id'], None),
+])
+def test_partitioned_job_config(columns, clustering_fields):
+    job_config = bigquery_load.partitioned_job_config(columns)
+
+    assert job_config.write_disposition == 'WRITE_APPEND'
+    assert job_config.range_partitioning.field == 'feed_partition'
+    partition_range = job_config.range_partitioning.range_
+    assert (partition_range.start, partition_range.end, partition_range.interval) == (20000, 21000, 1)
+    assert job_config.clustering_fields == clustering_fields
+
+
+def test_feed_partitions_fall_in_the_partition_range():
+    assert bigquery_load.feed_partition(2024, 'Summer') == 20243
+    start, end = bigquery_load.PARTITION_RANGE
+    assert start <= bigquery_load.feed_partition(2000, 'Winter') and bigquery_load.feed_partition(2099, 'Fall') < end
+
+
+def test_delete_feed_rows():
+    client = fake_bigquery.Client()
+    table_ref = client.table('dataset', 'trips')
+
+    bigquery_load.delete_feed_rows(client, table_ref, 2024)
+    bigquery_load.delete_feed_rows(client, table_ref, 2024, 'Fall')
+
+    assert client.queries == [
+        ('DELETE FROM `project.dataset.trips` WHERE year = @year', {'year': 2024}),
+        ('DELETE FROM `project.dataset.trips` WHERE year = @year AND season = @season', {'year': 2024, 'season': 'Fall'}),
+    ]
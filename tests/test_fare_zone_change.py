@@ -0,0 +1,29 @@
+import matplotlib
+import pandas as pd
+
+matplotlib.use('Agg')
+
+from analysis_scripts import fare_zone_change
+
+
+def stops(rows):
+    return pd.DataFrame(rows, columns=['stop_name', 'zone_id', 'location_type'])
+
+
+def test_zone_changes_and_heatmap():
+    tables = {}
+    for year in [2021, 2022, 2023, 2024]:
+        for season in fare_zone_change.seasons:
+            tables[f'stops_{year}_{season}'] = stops([
+                ('Readville', 'CR-zone1A' if year < 2023 else 'CR-zone1', 1),
+                ('Forest Hills', 'CR-zone1A', 1),
+                ('Forest Hills platform', 'CR-zone2', 0),
+                ('Haymarket', None, 1),
+            ])
+
+    changed = fare_zone_change.final_table(tables)
+
+    assert changed['stop_name'].tolist() == ['Readville']
+    assert changed[['zone_2021', 'zone_2024']].values.tolist() == [['CR-zone1A', 'CR-zone1']]
+    figure = fare_zone_change.plot_heatmap(changed)
+    assert figure.axes[0].get_title() == 'Zone Changes by Station and Year'
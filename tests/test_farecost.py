@@ -0,0 +1,88 @@
+import pandas as pd
+
+from analysis_scripts import farecost
+
+ZONES = ['area_commuter_rail_zone_2', 'area_commuter_rail_zone_6', 'area_commuter_rail_zone_8']
+
+
+def routes():
+    rows = [
+        ('CR-Fairmount', 'line-Fairmount', 'commuter_rail', 'Commuter Rail'),
+        ('CR-Lowell', 'line-Lowell', 'commuter_rail', 'Commuter Rail'),
+        ('CR-Foxboro', 'line-Foxboro', 'commuter_rail', 'Commuter Rail'),  # not in the zone mapping
+        ('CapeFlyer', 'line-CapeFlyer', 'cape_flyer', 'Commuter Rail'),
+        ('1', 'line-1', 'local_bus', 'Local Bus'),
+    ]
+    df = pd.DataFrame(rows, columns=['route_id', 'line_id', 'network_id', 'route_desc'])
+    return df.assign(agency_id='1', route_type=2, route_sort_order=1, route_color='80276C', route_text_color='FFFFFF')
+
+
+def fare_tables(amounts):
+    products = pd.DataFrame({
+        'fare_product_id': [f'cr_{zone[-1]}' for zone in ZONES] + ['cf', 'bus', 'cr_other'],
+        'fare_product_name': 'One Way',
+        'amount': amounts + [22.0, 1.7, 4.25],
+        'currency': 'USD',
+    })
+    rules = [('commuter_rail', 'area_commuter_rail_zone_1a', zone, f'cr_{zone[-1]}') for zone in ZONES]
+    rules += [
+        ('cape_flyer', 'area_commuter_rail_zone_1a', 'area_cf_zone_hyannis', 'cf'),
+        ('commuter_rail', 'area_commuter_rail_zone_2', 'area_commuter_rail_zone_8', 'cr_other'),
+        ('local_bus', 'area_commuter_rail_zone_1a', 'area_commuter_rail_zone_2', 'bus'),
+    ]
+    rules = pd.DataFrame(rules, columns=['network_id', 'from_area_id', 'to_area_id', 'fare_product_id'])
+    rules = rules.assign(leg_group_id='leg', from_timeframe_group_id=None, to_timeframe_group_id=None, transfer_only=0)
+    return products, rules
+
+
+def dataframes():
+    tables = {'routes_2023_Spring': routes()}
+    for (year, season), amounts in {(2023, 'Spring'): [6.5, 9.25, 11.0], (2024, 'Fall'): [7.0, 9.75, 12.25]}.items():
+        tables[f'fare_products_{year}_{season}'], tables[f'fare_leg_rules_{year}_{season}'] = fare_tables(amounts)
+    return tables
+
+
+def old_commuter_rail_rows(dataframes, to_area_id_mapping):
+    # the merge and row-wise apply of the baseline process_fares_and_routes / filter_commuter_rail_data
+    fares = pd.concat([farecost.read_fares(dataframes[f'fare_products_{year}_{season}'].copy(), year, season)
+                       for year, season in [(2023, 'Spring'), (2024, 'Fall')]], ignore_index=True)
+    rules = pd.concat([dataframes[f'fare_leg_rules_{year}_{season}'] for year, season in [(2023, 'Spring'), (2024, 'Fall')]],
+                      ignore_index=True)
+    rules = rules.drop(columns=['transfer_only', 'from_timeframe_group_id', 'to_timeframe_group_id'])
+    combined = pd.merge(fares, rules, on='fare_product_id', how='inner')
+    combined = pd.merge(combined, farecost.process_routes(dataframes['routes_2023_Spring']), on='network_id', how='left')
+    cr = combined[combined['network_id'].isin(['commuter_rail', 'cape_flyer'])]
+    cr = cr[cr['from_area_id'] == 'area_commuter_rail_zone_1a'].drop_duplicates()
+    return cr[cr.apply(lambda row: row['to_area_id'] == to_area_id_mapping.get(row['line_id'], row['to_area_id']), axis=1)]
+
+
+def rows(df):
+    columns = ['route_id', 'to_area_id', 'fare_product_id', 'amount', 'year', 'season']
+    return sorted(map(tuple, df[columns].drop_duplicates().astype(str).to_numpy()))
+
+
+def test_commuter_rail_filter_picks_the_old_rows():
+    tables = dataframes()
+    mapping = {'line-CapeFlyer': 'area_cf_zone_hyannis', 'line-Fairmount': 'area_commuter_rail_zone_2',
+               'line-Lowell': 'area_commuter_rail_zone_6'}
+    fares = {f'fares_{season}{year}': farecost.read_fares(tables[f'fare_products_{year}_{season}'].copy(), year, season)
+             for year, season in [(2023, 'Spring'), (2024, 'Fall')]}
+    rules = {f'fares_rules_{season}{year}': tables[f'fare_leg_rules_{year}_{season}']
+             for year, season in [(2023, 'Spring'), (2024, 'Fall')]}
+
+    combined = farecost.process_fares_and_routes(fares, rules, farecost.process_routes(tables['routes_2023_Spring']))
+    filtered = farecost.filter_commuter_rail_data(combined, mapping)
+
+    assert rows(filtered) == rows(old_commuter_rail_rows(tables, mapping))
+    picked = {(route, zone) for route, zone, *_ in rows(filtered)}
+    assert picked == {('CR-Fairmount', ZONES[0]), ('CR-Lowell', ZONES[1]), ('CapeFlyer', 'area_cf_zone_hyannis'),
+                      ('CR-Foxboro', ZONES[0]), ('CR-Foxboro', ZONES[1]), ('CR-Foxboro', ZONES[2])}
+
+
+def test_final_table():
+    table = farecost.main(dataframes())
+
+    assert table.to_dict('list') == {
+        'route_id': ['CapeFlyer', 'CR-Foxboro', 'CR-Lowell', 'CR-Fairmount'],
+        'amount': ['$22.00', '$12.25', '$9.75', '$7.00'],
+    }
@@ -0,0 +1,170 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import feed_set
+from feed_set import FeedSet
+
+ROWS = 1000
+
+
+class Store:
+    """
+    Stands in for feed_store.load_tables, counting the reads per key.
+    Feeds of the year 2020 do not exist.
+    """
+
+    def __init__(self):
+        self.reads = {}
+        self.error = None
+
+    def load_tables(self, year, season, table_names, columns=None, store_dir=None):
+        key = (year, season, table_names[0])
+        self.reads[key] = self.reads.get(key, 0) + 1
+        if self.error is not None:
+            raise self.error
+        if year == 2020:
+            return {}
+        return {table_names[0]: pd.DataFrame({'trip_id': [f'{year}-{season}-{i}' for i in range(ROWS)],
+                                              'stop_sequence': range(ROWS)})}
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = Store()
+    monkeypatch.setattr(feed_set.feed_store, 'load_tables', store.load_tables)
+    return store
+
+
+def table_size(store):
+    df = store.load_tables(2019, 'Fall', ['trips'])['trips']
+    store.reads.clear()
+    return int(df.memory_usage(deep=True).sum())
+
+
+def test_tables_are_loaded_once(store):
+    feeds = FeedSet([2019], ['Fall'], ['trips'], memory_budget=None)
+
+    first = feeds.get(2019, 'Fall', 'trips')
+    assert feeds.get(2019, 'Fall', 'trips') is first
+    assert feeds[2019, 'Fall', 'trips'] is first
+    assert store.reads == {(2019, 'Fall', 'trips'): 1}
+    assert feeds.stats['hits'] == 2
+
+
+def test_least_recently_used_tables_are_evicted(store):
+    feeds = FeedSet([2019], ['Spring', 'Summer', 'Fall'], ['trips'], memory_budget=table_size(store) * 5 // 2)
+
+    feeds.get(2019, 'Spring', 'trips')
+    feeds.get(2019, 'Summer', 'trips')
+    feeds.get(2019, 'Spring', 'trips')  # Summer is now the least recently used
+    feeds.get(2019, 'Fall', 'trips')
+
+    assert list(feeds._tables) == [(2019, 'Spring', 'trips'), (2019, 'Fall', 'trips')]
+    assert feeds.memory_usage() <= feeds.memory_budget
+    assert feeds.stats['evictions'] == 1 and feeds.stats['spills'] == 0
+
+    # raw tables are simply read from the store again
+    summer = feeds.get(2019, 'Summer', 'trips')
+    assert summer['trip_id'][0] == '2019-Summer-0'
+    assert store.reads[(2019, 'Summer', 'trips')] == 2
+    assert list(feeds._tables) == [(2019, 'Fall', 'trips'), (2019, 'Summer', 'trips')]
+
+
+def test_the_newest_table_stays_over_budget(store):
+    feeds = FeedSet([2019], ['Spring', 'Summer'], ['trips'], memory_budget=1)
+
+    feeds.get(2019, 'Spring', 'trips')
+    assert feeds.get(2019, 'Summer', 'trips') is not None
+    assert list(feeds._tables) == [(2019, 'Summer', 'trips')]
+
+
+def test_prepared_tables_are_spilled_and_reloaded(store):
+    prepared = []
+
+    def prepare(trips):
+        prepared.append(trips['trip_id'][0])
+        return trips.assign(stop_count=trips['stop_sequence'] + 1)
+
+    feeds = FeedSet([2019], ['Spring', 'Summer'], ['trips'], prepare={'trips': prepare},
+                    memory_budget=table_size(store) * 3 // 2)
+
+    spring = feeds.get(2019, 'Spring', 'trips').copy()
+    feeds.get(2019, 'Summer', 'trips')
+    assert feeds.stats['spills'] == 1
+
+    reloaded = feeds.get(2019, 'Spring', 'trips')
+    pd.testing.assert_frame_equal(reloaded, spring)
+    # read back from the spill file: neither the store nor prepare are used again
+    assert store.reads[(2019, 'Spring', 'trips')] == 1
+    assert prepared == ['2019-Spring-0', '2019-Summer-0']
+    # a table is spilled at most once
+    feeds.get(2019, 'Summer', 'trips')
+    assert feeds.stats['spills'] == 2
+    feeds.get(2019, 'Spring', 'trips')
+    assert feeds.stats['spills'] == 2
+
+
+def test_missing_feeds_are_remembered(store):
+    feeds = FeedSet([2020], ['Fall'], ['trips'])
+
+    assert feeds.get(2020, 'Fall', 'trips') is None
+    assert (2020, 'Fall', 'trips') not in feeds
+    with pytest.raises(KeyError):
+        feeds[2020, 'Fall', 'trips']
+    assert store.reads == {(2020, 'Fall', 'trips'): 1}
+
+
+def test_absent_partitions_are_retried(store):
+    feeds = FeedSet([2019], ['Fall'], ['trips'])
+    store.error = FileNotFoundError('data.parquet')
+
+    assert feeds.get(2019, 'Fall', 'trips') is None
+    store.error = None
+    assert feeds.get(2019, 'Fall', 'trips') is not None
+    assert store.reads == {(2019, 'Fall', 'trips'): 2}
+
+
+def test_other_load_errors_propagate(store):
+    feeds = FeedSet([2019], ['Fall'], ['trips'])
+    store.error = OSError('corrupt parquet file')
+
+    with pytest.raises(OSError):
+        feeds.get(2019, 'Fall', 'trips')
+    store.error = None
+    assert feeds.get(2019, 'Fall', 'trips') is not None
+
+
+def test_prepare_errors_propagate(store):
+    def prepare(trips):
+        raise ValueError('bad prepare')
+
+    feeds = FeedSet([2019], ['Fall'], ['trips'], prepare={'trips': prepare})
+    with pytest.raises(ValueError):
+        feeds.get(2019, 'Fall', 'trips')
+
+
+def test_two_digit_years_share_the_tables(store):
+    feeds = FeedSet([19], ['Fall'], ['trips'])
+
+    assert feeds.get(19, 'Fall', 'trips') is feeds.get(2019, 'Fall', 'trips')
+    assert feeds.keys() == [(2019, 'Fall', 'trips')]
+    assert store.reads == {(2019, 'Fall', 'trips'): 1}
+
+
+def test_threads_load_a_table_once_and_different_tables_in_parallel(store):
+    # both seasons are prepared at the same time, which deadlocks if loads are serialized
+    barrier = threading.Barrier(2, timeout=10)
+
+    def prepare(trips):
+        barrier.wait()
+        return trips
+
+    feeds = FeedSet([2019], ['Spring', 'Fall'], ['trips'], prepare={'trips': prepare})
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        tables = list(executor.map(lambda season: feeds.get(2019, season, 'trips'), ['Spring', 'Fall'] * 4))
+
+    assert all(df is tables[0] for df in tables[::2]) and all(df is tables[1] for df in tables[1::2])
+    assert store.reads == {(2019, 'Spring', 'trips'): 1, (2019, 'Fall', 'trips'): 1}
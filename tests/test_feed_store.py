@@ -0,0 +1,117 @@
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+
+import pandas as pd
+
+import feed_store
+
+ROUTES = 'route_id,route_long_name\nCR-Fairmount,Fairmount Line\n'
+TRIPS = 'route_id,service_id,trip_id\nCR-Fairmount,weekday,1\nCR-Fairmount,weekday,2\n'
+
+
+def make_archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+ARCHIVES = {
+    '/old.zip': make_archive({'routes.txt': ROUTES}),
+    '/new.zip': make_archive({'routes.txt': ROUTES, 'trips.txt': TRIPS}),
+}
+
+
+def archive_server(serve, requests):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests.append(self.path)
+            body = ARCHIVES[self.path]
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return serve(Handler)
+
+
+def test_reingests_when_the_archive_changes(serve, monkeypatch, tmp_path):
+    requests = []
+    base_url = archive_server(serve, requests)
+    feed_urls = {(2024, 'Fall'): f'{base_url}/old.zip'}
+    monkeypatch.setattr(feed_store, 'find_feed_url', lambda year, season: feed_urls.get((year, season)))
+    store_dir = str(tmp_path)
+
+    tables = feed_store.load_tables(2024, 'Fall', ['routes', 'trips'], store_dir=store_dir)
+    assert sorted(tables) == ['routes']
+    opened = len(requests)
+
+    # same archive: the stored tables and the missing marker are reused
+    tables = feed_store.load_tables(2024, 'Fall', ['routes', 'trips'], store_dir=store_dir)
+    assert sorted(tables) == ['routes']
+    assert len(requests) == opened
+
+    # the catalog now lists another archive: trips is no longer missing
+    feed_urls[(2024, 'Fall')] = f'{base_url}/new.zip'
+    tables = feed_store.load_tables(2024, 'Fall', ['routes', 'trips'], store_dir=store_dir)
+    assert sorted(tables) == ['routes', 'trips']
+    assert tables['trips']['trip_id'].astype(str).tolist() == ['1', '2']
+    assert requests[-1] == '/new.zip'
+
+    # and the newer archive dropping trips again turns it back into a marker
+    feed_urls[(2024, 'Fall')] = f'{base_url}/old.zip'
+    assert sorted(feed_store.load_tables(2024, 'Fall', ['routes', 'trips'], store_dir=store_dir)) == ['routes']
+
+
+def test_no_feed_in_the_catalog(monkeypatch, tmp_path):
+    monkeypatch.setattr(feed_store, 'find_feed_url', lambda year, season: None)
+    assert feed_store.load_tables(2019, 'Winter', ['routes'], store_dir=str(tmp_path)) == {}
+
+
+def test_concurrent_writes_of_a_partition(tmp_path):
+    store_dir = str(tmp_path)
+    frames = [pd.DataFrame({'trip_id': [str(i)] * 1000, 'writer': i}) for i in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda df: feed_store.write_table(df, 'trips', 2024, 'Fall', store_dir), frames))
+
+    stored = pd.read_parquet(feed_store._data_path('trips', 2024, 'Fall', store_dir))
+    assert len(stored) == 1000 and stored['writer'].nunique() == 1
+    assert not [name for name in (tmp_path / 'trips' / 'year=2024' / 'season=Fall').iterdir() if name.suffix == '.tmp']
+
+
+def test_concurrent_ingests_of_a_feed(serve, monkeypatch, tmp_path):
+    requests = []
+    base_url = archive_server(serve, requests)
+    monkeypatch.setattr(feed_store, 'find_feed_url', lambda year, season: f'{base_url}/new.zip')
+    store_dir = str(tmp_path)
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        results = list(executor.map(lambda _: feed_store.load_tables(2024, 'Fall', ['routes', 'trips'], store_dir=store_dir),
+                                    range(6)))
+
+    assert all(sorted(tables) == ['routes', 'trips'] for tables in results)
+    assert all(len(tables['trips']) == 2 for tables in results)
+
+
+def test_ingest_does_not_keep_parsed_tables(serve, monkeypatch, tmp_path):
+    requests = []
+    base_url = archive_server(serve, requests)
+    monkeypatch.setattr(feed_store, 'find_feed_url', lambda year, season: f'{base_url}/new.zip')
+    opened = []
+    extract_tables = feed_store.feed_tables.extract_tables
+
+    def recording_extract_tables(*args, **kwargs):
+        opened.append(extract_tables(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(feed_store.feed_tables, 'extract_tables', recording_extract_tables)
+
+    assert feed_store.ingest(2024, 'Fall', ['routes', 'trips', 'shapes'], str(tmp_path))
+    assert opened and not opened[0]._tables
@@ -0,0 +1,48 @@
+import io
+import zipfile
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import feed_tables
+
+ARCHIVE = io.BytesIO()
+with zipfile.ZipFile(ARCHIVE, 'w') as archive:
+    archive.writestr('routes.txt', 'route_id,route_type\nCR-Fairmount,2\n')
+    archive.writestr('stop_times.txt', 'trip_id,arrival_time,departure_time,stop_id,stop_sequence\n1,08:00:00,08:00:00,place-DB-0095,1\n')
+ARCHIVE = ARCHIVE.getvalue()
+
+
+def range_headers(serve):
+    # no Range support, only which requests asked for a range is recorded
+    headers = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            headers.append(self.headers.get('Range'))
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(ARCHIVE)))
+            self.end_headers()
+            self.wfile.write(ARCHIVE)
+
+    return serve(Handler), headers
+
+
+@pytest.mark.parametrize('table_names, ranged', [
+    (['routes'], True),
+    (['routes', 'stop_times'], False),
+    (None, False),
+])
+def test_large_tables_skip_range_requests(serve, table_names, ranged):
+    base_url, headers = range_headers(serve)
+
+    with feed_tables.extract_tables(f'{base_url}/feed.zip', table_names, remote=True) as tables:
+        assert 'routes' in tables
+        assert tables.read('routes')['route_id'].tolist() == ['CR-Fairmount']
+        assert not tables._tables
+
+    assert (headers[0] is not None) == ranged
+    assert headers[-1] is None
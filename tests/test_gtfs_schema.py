@@ -0,0 +1,30 @@
+import io
+
+import pandas as pd
+
+import bigquery_load
+import gtfs_schema
+
+FEED_INFO = """feed_publisher_name,feed_publisher_url,feed_lang,feed_start_date,feed_end_date,feed_version,feed_contact_email
+MBTA,http://www.mbta.com,EN,20240906,20241231,Fall 2024 version 1,developer@mbta.com
+"""
+
+
+def test_date_columns_are_read_as_text():
+    # the loaders only turn text dates into DATE, an inferred int64 column stays a number
+    registered = {column for table in gtfs_schema.TABLES.values() for column in table}
+    assert gtfs_schema.DATE_COLUMNS <= registered
+    for table in gtfs_schema.TABLES.values():
+        for column in gtfs_schema.DATE_COLUMNS & set(table):
+            assert table[column] is str
+
+
+def test_feed_info_dates_load_as_dates():
+    feed_info = pd.read_csv(io.StringIO(FEED_INFO), **gtfs_schema.read_options('feed_info'))
+    prepared = bigquery_load.prepare_table(feed_info, 'feed_info')
+
+    types = dict(bigquery_load.column_types(prepared))
+    assert types['feed_start_date'] == bigquery_load.DATE
+    assert types['feed_end_date'] == bigquery_load.DATE
+    assert types['feed_version'] == bigquery_load.STRING
+    assert str(prepared['feed_start_date'][0]) == '2024-09-06'
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+from gtfs_time import INVALID, SERVICE_PERIODS, parse_time_columns, parse_times, time_periods, trip_extents
+
+def test_parse_times():
+    times = pd.Series(['08:05:30', '8:05:30', '00:00:00', '23:59:59', '24:00:00', '25:30:00', ' 07:00:00 '],
+                      index=list('abcdefg'))
+
+    seconds, valid = parse_times(times)
+
+    assert seconds.tolist() == [29130, 29130, 0, 86399, 86400, 91800, 25200]
+    assert valid.all()
+    assert seconds.dtype == np.int32
+    assert list(seconds.index) == list('abcdefg')
+
+
+def test_parse_times_rejects_missing_and_malformed_times():
+    times = pd.Series(['', None, np.nan, '08:60:00', '08:00:60', '08:00', '08-00-00', 'ab:cd:ef', '8 AM',
+                       '100:00:00', '123:00:00', '08:00:00:00', '０８:00:00'])
+
+    seconds, valid = parse_times(times)
+
+    assert seconds.tolist() == [INVALID] * len(times)
+    assert not valid.any()
+
+
+def test_parse_time_columns_drops_invalid_rows():
+    df = pd.DataFrame({'arrival_time': ['08:00:00', '25:00:00', None], 'departure_time': ['08:01:00', 'x', '09:00:00']})
+
+    parsed = parse_time_columns(df)
+
+    assert parsed['arrival_seconds'].tolist() == [28800]
+    assert parsed['departure_seconds'].tolist() == [28860]
+
+
+def old_time_of_day(time_str):
+    # the apply-based classification TripCount used before time_periods
+    hour = int(time_str.split(':')[0])
+    if 3 <= hour < 6:
+        return 'Sunrise'
+    elif 6 <= hour < 7:
+        return 'Early AM'
+    elif 7 <= hour < 9:
+        return 'AM Peak'
+    elif 9 <= hour < 13.5:
+        return 'Midday Base'
+    elif 13.5 <= hour < 16:
+        return 'Midday School'
+    elif 16 <= hour < 18.5:
+        return 'PM Peak'
+    elif 18.5 <= hour < 22:
+        return 'Evening'
+    elif 22 <= hour < 24:
+        return 'Late Evening'
+    else:
+        return 'Night'
+
+
+def period_labels(times):
+    seconds, _ = parse_times(pd.Series(times))
+    return time_periods(seconds).astype(object).tolist()
+
+
+def test_time_periods_match_the_old_classification():
+    times = [f'{hour:02}:{minute:02}:{second:02}' for hour in range(27) for minute in range(60) for second in (0, 59)]
+    # the old code compared whole hours, so it could not see the 13:30 and 18:30 bounds
+    times = [time for time in times if time[:2] not in ('13', '18') or time[3:5] < '30']
+
+    assert period_labels(times) == [old_time_of_day(time) for time in times]
+
+
+def test_time_periods_at_every_boundary():
+    times, expected = [], []
+    for index, (label, start) in enumerate(SERVICE_PERIODS):
+        start = int(start * 3600)
+        # the second before a period starts still belongs to the one before it
+        for seconds, period in [(start - 1, SERVICE_PERIODS[index - 1][0]), (start, label)]:
+            times.append(f'{seconds // 3600:02}:{seconds // 60 % 60:02}:{seconds % 60:02}')
+            expected.append(period)
+
+    assert period_labels(times) == expected
+
+
+def test_time_periods_wrap_past_midnight():
+    # 24:00-26:59 is still the night of the service day, 27:00 is 3 AM the next morning
+    assert period_labels(['00:00:00', '02:59:59', '24:00:00', '26:59:59', '27:00:00', '29:59:59', '30:00:00']) == \
+        ['Night', 'Night', 'Night', 'Night', 'Sunrise', 'Sunrise', 'Early AM']
+
+
+def test_time_periods_leave_invalid_times_missing():
+    periods = time_periods(pd.Series([INVALID, 3600], index=[5, 6]))
+
+    assert periods.isna().tolist() == [True, False]
+    assert list(periods.index) == [5, 6]
+    assert list(periods.cat.categories) == [label for label, _ in SERVICE_PERIODS]
+    assert periods.cat.ordered
+
+
+COLUMNS = ['trip_id', 'route_id', 'first_departure', 'last_arrival', 'duration', 'stop_count']
+
+
+def stop_times(rows):
+    df = pd.DataFrame(rows, columns=['trip_id', 'route_id', 'stop_sequence', 'arrival_time', 'departure_time'])
+    return parse_time_columns(df)
+
+
+def test_trip_extents_follow_stop_sequence():
+    extents = trip_extents(stop_times([
+        ('a', 'CR-Fairmount', 2, '08:30:00', '08:31:00'),
+        ('a', 'CR-Fairmount', 1, '08:00:00', '08:01:00'),
+        ('b', 'CR-Worcester', 1, '23:50:00', '23:50:00'),
+        ('a', 'CR-Fairmount', 3, '09:00:00', '09:00:00'),
+        ('b', 'CR-Worcester', 2, '25:10:00', '25:10:00'),
+    ]), carry=['route_id'])
+
+    assert list(extents.columns) == COLUMNS
+    assert extents['trip_id'].tolist() == ['a', 'b']
+    assert extents['route_id'].tolist() == ['CR-Fairmount', 'CR-Worcester']
+    assert extents['first_departure'].tolist() == [8 * 3600 + 60, 23 * 3600 + 50 * 60]
+    assert extents['duration'].tolist() == [3540, 4800]
+    assert extents['stop_count'].tolist() == [3, 2]
+
+
+def test_trip_extents_of_no_stop_times():
+    extents = trip_extents(stop_times([]), carry=['route_id'])
+
+    assert list(extents.columns) == COLUMNS
+    assert len(extents) == 0
+
+
+def test_trip_extents_of_only_malformed_times():
+    extents = trip_extents(stop_times([('a', 'CR-Fairmount', 1, '8 AM', '8 AM')]), carry=['route_id'])
+
+    assert list(extents.columns) == COLUMNS
+    assert len(extents) == 0
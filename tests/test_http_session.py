@@ -0,0 +1,108 @@
+import io
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+
+import archive_cache
+import http_session
+
+
+def make_zip(name, content):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+class SlowServer:
+    """
+    Stand-in for the archive host: every response takes latency seconds, the
+    first failures requests of each path fail with fail_status, and the peak
+    number of requests in flight is recorded.
+    """
+
+    def __init__(self, latency=0.1, failures=0, fail_status=503):
+        self.latency = latency
+        self.failures = failures
+        self.fail_status = fail_status
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = {}
+        self.lock = threading.Lock()
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.in_flight += 1
+                    server.peak = max(server.peak, server.in_flight)
+                    server.requests[self.path] = server.requests.get(self.path, 0) + 1
+                    attempt = server.requests[self.path]
+                try:
+                    time.sleep(server.latency)
+                    if attempt <= server.failures:
+                        body, status = b'try again', server.fail_status
+                    else:
+                        body, status = make_zip('path.txt', self.path), 200
+                    self.send_response(status)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+
+        return Handler
+
+
+def test_requests_per_host_are_capped(serve, monkeypatch):
+    monkeypatch.setattr(http_session, 'MAX_PER_HOST', 2)
+    server = SlowServer(latency=0.2)
+    base_url = serve(server.handler())
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(lambda i: http_session.get(f'{base_url}/{i}'), range(8)))
+
+    assert all(response.status_code == 200 for response in responses)
+    assert server.peak == 2
+
+
+def test_failed_requests_are_retried(serve):
+    server = SlowServer(latency=0, failures=2)
+    base_url = serve(server.handler())
+
+    response = http_session.get(f'{base_url}/feed.zip')
+
+    assert response.status_code == 200
+    assert server.requests['/feed.zip'] == 3
+
+
+def test_rate_limited_requests_are_retried(serve):
+    server = SlowServer(latency=0, failures=1, fail_status=429)
+    base_url = serve(server.handler())
+
+    assert http_session.get(f'{base_url}/feed.zip').status_code == 200
+    assert server.requests['/feed.zip'] == 2
+
+
+def test_prefetch_respects_cap_and_retries(serve, monkeypatch, tmp_path):
+    monkeypatch.setattr(http_session, 'MAX_PER_HOST', 3)
+    server = SlowServer(latency=0.2, failures=1)
+    base_url = serve(server.handler())
+    archive_urls = [f'{base_url}/MBTA_GTFS_{i}.zip' for i in range(6)]
+
+    paths = archive_cache.prefetch(archive_urls, max_workers=6, cache_dir=str(tmp_path))
+
+    assert sorted(paths) == sorted(archive_urls)
+    assert server.peak == 3
+    assert all(count == 2 for count in server.requests.values())
+    for archive_url, path in paths.items():
+        with zipfile.ZipFile(path) as archive:
+            assert archive.read('path.txt').decode() == archive_url[len(base_url):]
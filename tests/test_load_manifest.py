@@ -0,0 +1,73 @@
+import json
+
+from load_manifest import LoadManifest
+
+TRIPS = 'project.gtfs.trips'
+ROUTES = 'project.gtfs.routes'
+FEED_TABLES = ['routes', 'trips']
+
+
+def test_records_are_appended_as_json_lines(tmp_path):
+    path = tmp_path / 'manifest.jsonl'
+    manifest = LoadManifest(str(path))
+
+    manifest.record(TRIPS, 2024, 'Fall', 'https://cdn/a.zip', 'h1', 10, FEED_TABLES)
+    manifest.record(TRIPS, 2024, 'Fall', 'https://cdn/b.zip', 'h2', 12, FEED_TABLES)
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line['content_hash'] for line in lines] == ['h1', 'h2']
+    assert lines[0]['table'] == 'trips'
+    assert lines[0]['feed_tables'] == FEED_TABLES
+    assert lines[0]['rows'] == 10 and lines[0]['loaded_at']
+    assert manifest.get(TRIPS, 2024, 'Fall')['archive_url'] == 'https://cdn/b.zip'
+
+
+def test_the_last_entry_wins_on_reload(tmp_path):
+    path = str(tmp_path / 'manifest.jsonl')
+    manifest = LoadManifest(path)
+    manifest.record(TRIPS, 2024, 'Fall', 'https://cdn/a.zip', 'h1', 10, FEED_TABLES)
+    manifest.record(TRIPS, 2024, 'Summer', 'https://cdn/s.zip', 'h3', 5, FEED_TABLES)
+    manifest.record(TRIPS, 2024, 'Fall', 'https://cdn/b.zip', 'h2', 12, FEED_TABLES)
+    with open(path, 'a') as file:
+        file.write('\n')  # blank lines are skipped
+
+    reloaded = LoadManifest(path)
+
+    assert reloaded.get(TRIPS, 2024, 'Fall')['content_hash'] == 'h2'
+    assert reloaded.get(TRIPS, 2024, 'Summer')['content_hash'] == 'h3'
+    assert reloaded.get(TRIPS, 2023, 'Fall') is None
+    assert sorted(entry['season'] for entry in reloaded.entries(TRIPS, 2024)) == ['Fall', 'Summer']
+    assert [entry['season'] for entry in reloaded.entries(TRIPS, 2024, 'Summer')] == ['Summer']
+    assert reloaded.entries(ROUTES, 2024) == []
+
+
+def test_is_current(tmp_path):
+    manifest = LoadManifest(str(tmp_path / 'manifest.jsonl'))
+    assert not manifest.is_current(TRIPS, 2024, 'Fall', 'h1')
+
+    manifest.record(TRIPS, 2024, 'Fall', 'https://cdn/a.zip', 'h1', 10, FEED_TABLES)
+
+    assert manifest.is_current(TRIPS, 2024, 'Fall', 'h1')
+    assert not manifest.is_current(TRIPS, 2024, 'Fall', 'h2')
+    assert not manifest.is_current(TRIPS, 2024, 'Winter', 'h1')
+
+
+def test_feed_loaded_needs_every_table_from_the_same_archive(tmp_path):
+    manifest = LoadManifest(str(tmp_path / 'manifest.jsonl'))
+    assert not manifest.feed_loaded('project.gtfs', 2024, 'Fall', 'https://cdn/a.zip')
+
+    manifest.record(TRIPS, 2024, 'Fall', 'https://cdn/a.zip', 'h1', 10, FEED_TABLES)
+    assert not manifest.feed_loaded('project.gtfs', 2024, 'Fall', 'https://cdn/a.zip')
+
+    manifest.record(ROUTES, 2024, 'Fall', 'https://cdn/a.zip', 'h2', 3, FEED_TABLES)
+    assert manifest.feed_loaded('project.gtfs', 2024, 'Fall', 'https://cdn/a.zip')
+    assert not manifest.feed_loaded('project.gtfs', 2024, 'Fall', 'https://cdn/b.zip')
+    assert not manifest.feed_loaded('project.other', 2024, 'Fall', 'https://cdn/a.zip')
+    assert not manifest.feed_loaded('project.gtfs', 2024, 'Winter', 'https://cdn/a.zip')
+
+    # a newer archive only partly loaded: neither archive counts as fully loaded
+    manifest.record(TRIPS, 2024, 'Fall', 'https://cdn/b.zip', 'h3', 11, FEED_TABLES)
+    assert not manifest.feed_loaded('project.gtfs', 2024, 'Fall', 'https://cdn/a.zip')
+    assert not manifest.feed_loaded('project.gtfs', 2024, 'Fall', 'https://cdn/b.zip')
+    manifest.record(ROUTES, 2024, 'Fall', 'https://cdn/b.zip', 'h2', 3, FEED_TABLES)
+    assert LoadManifest(manifest.path).feed_loaded('project.gtfs', 2024, 'Fall', 'https://cdn/b.zip')
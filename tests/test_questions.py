@@ -0,0 +1,77 @@
+import pandas as pd
+
+import archive_cache
+import feed_store
+import questions
+from feed_set import FeedSet
+from stub_feeds import StubFeeds
+
+
+def test_ingest_inputs_reports_a_failed_feed_and_keeps_the_rest(monkeypatch, capsys):
+    monkeypatch.setattr(questions, 'find_feed_url', lambda year, season: f'https://feeds/{year}{season}.zip')
+    monkeypatch.setattr(archive_cache, 'prefetch', lambda archive_urls, max_workers: {})
+    ingested = []
+
+    def ingest(year, season, table_names):
+        if (year, season) == (2022, 'Fall'):
+            raise OSError('connection reset')
+        ingested.append((year, season, table_names))
+        return (year, season) != (2021, 'Winter')  # no feed in the catalog
+
+    monkeypatch.setattr(feed_store, 'ingest', ingest)
+
+    feeds = questions.ingest_inputs(['q3', 'q6'], max_workers=4)
+
+    assert 'Feed not available for Fall 2022: connection reset' in capsys.readouterr().out
+    assert len(ingested) == len(questions.YEARS) * len(questions.SEASONS) - 1
+    expected = questions.needed_feeds(['q3', 'q6'])
+    del expected[2022, 'Fall'], expected[2021, 'Winter']
+    assert feeds == expected
+    assert feeds[2023, 'Spring'] == {'stops', 'trips'}
+
+
+def test_run_shares_one_feed_set(monkeypatch):
+    calls = []
+    for step, (dependencies, _) in list(questions.STEPS.items()):
+        def function(feeds, *results, step=step):
+            calls.append((step, feeds, results))
+            return step
+        monkeypatch.setitem(questions.STEPS, step, (dependencies, function))
+
+    tables = questions.run(['q5', 'q6', 'q7'], max_workers=4)
+
+    assert tables == {'q5': 'q5', 'q6': 'q6', 'q7': 'q7'}
+    feeds = {id(feeds) for _, feeds, _ in calls}
+    assert len(feeds) == 1 and len(calls) == 4
+    feeds = calls[0][1]
+    assert isinstance(feeds, FeedSet)
+    assert feeds.table_names == ['calendar', 'routes', 'stop_times', 'trips']
+    assert feeds.years == questions.YEARS
+    assert sorted((step, results) for step, _, results in calls if results) == [('q6', ('cleaned_trips',)), ('q7', ('q5',))]
+
+
+def test_steps_read_the_shared_tables_without_changing_them():
+    from analysis_scripts import Net_num_of_trains, schedule
+
+    trips = pd.DataFrame({'route_id': ['CR-Fairmount', 'CR-Fairmount', '1'], 'service_id': ['weekday'] * 3,
+                          'trip_id': ['a', 'b', 'c'], 'direction_id': [0, 1, 0], 'shape_id': ['s'] * 3})
+    # stop times as the shared FeedSet prepares them for the trip counts, with extra columns
+    stop_times = pd.DataFrame({'trip_id': ['a', 'a', 'b', 'b'], 'arrival_time': ['07:00:00', '07:30:00', '08:00:00', '08:40:00'],
+                               'departure_time': ['07:00:00', '07:30:00', '08:00:00', '08:40:00'],
+                               'stop_id': ['x', 'y', 'x', 'y'], 'stop_sequence': [1, 2, 1, 2],
+                               'stop_headsign': [None] * 4, 'time_period': ['AM Peak'] * 4})
+    calendar = pd.DataFrame({'service_id': ['weekday'], **{day: [1] for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']},
+                             'saturday': [0], 'sunday': [0], 'start_date': [20230101], 'end_date': [20230401]})
+    routes = pd.DataFrame({'route_id': ['CR-Fairmount', '1'], 'route_desc': ['Commuter Rail', 'Local Bus'], 'route_color': [None, 'FFC72C']})
+    tables = {'trips': trips, 'stop_times': stop_times, 'calendar': calendar, 'routes': routes}
+    feeds = StubFeeds({(2023, 'Spring', name): table for name, table in tables.items()})
+    copies = {name: table.copy() for name, table in tables.items()}
+
+    cleaned = Net_num_of_trains.main([2023], ['Spring'], feeds=feeds)
+    assert Net_num_of_trains.get_net_trains_per_line(cleaned).to_dict('list') == {'route_id': ['CR-FAIRMOUNT'], 'net_trains': [2]}
+    cleaned_data = schedule.load_cleaned_data(None, [2023], ['Spring'], feeds=feeds)
+    route_data = schedule.aggregate_route_data(schedule.merge_cleaned_data(cleaned_data))
+    assert route_data['average_trip_duration'].tolist() == [pd.Timedelta(minutes=35)]
+
+    for name, table in tables.items():
+        pd.testing.assert_frame_equal(table, copies[name])
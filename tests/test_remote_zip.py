@@ -0,0 +1,110 @@
+import io
+import random
+import re
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import remote_zip
+
+MEMBERS = {
+    'agency.txt': 'agency_id,agency_name\n1,MBTA\n',
+    'routes.txt': 'route_id,route_long_name\nCR-Fairmount,Fairmount Line\nCR-Worcester,Framingham/Worcester Line\n',
+    # large enough that the archive does not fit in the first tail request
+    'stop_times.txt': 'trip_id,arrival_time,stop_id\n' + ''.join(
+        f'{i},{random.Random(i).randrange(86400)},{random.Random(-i).randrange(1000)}\n' for i in range(40000)),
+}
+
+
+def make_archive():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in MEMBERS.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+ARCHIVE = make_archive()
+
+
+class ArchiveServer:
+    """
+    Serves ARCHIVE at any path, answering Range requests with 206 if
+    ranges is set and with the whole archive otherwise.
+    """
+
+    def __init__(self, ranges):
+        self.ranges = ranges
+        self.statuses = []
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body, status = ARCHIVE, 200
+                match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range', ''))
+                if server.ranges and match:
+                    start, end = match.groups()
+                    if not start:
+                        start, end = max(len(ARCHIVE) - int(end), 0), len(ARCHIVE) - 1
+                    else:
+                        start, end = int(start), min(int(end or len(ARCHIVE) - 1), len(ARCHIVE) - 1)
+                    body, status = ARCHIVE[start:end + 1], 206
+                self.send_response(status)
+                if status == 206:
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{len(ARCHIVE)}')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server.lock:
+                    server.statuses.append(status)
+                    server.bytes_sent += len(body)
+
+        return Handler
+
+
+@pytest.mark.parametrize('name', sorted(MEMBERS))
+def test_members_over_range_requests(serve, name):
+    server = ArchiveServer(ranges=True)
+    base_url = serve(server.handler())
+    fallbacks = remote_zip.stats['fallbacks']
+
+    with remote_zip.open_archive(f'{base_url}/MBTA_GTFS.zip') as archive:
+        assert isinstance(archive, remote_zip.RemoteZipFile)
+        assert sorted(archive.namelist()) == sorted(MEMBERS)
+        assert archive.read(name).decode() == MEMBERS[name]
+
+    assert remote_zip.stats['fallbacks'] == fallbacks
+    assert set(server.statuses) == {206}
+    if name != 'stop_times.txt':
+        # the tail and one request for the member, not the whole archive
+        assert len(server.statuses) <= 2
+        assert server.bytes_sent < len(ARCHIVE)
+
+
+def test_falls_back_without_range_support(serve):
+    server = ArchiveServer(ranges=False)
+    base_url = serve(server.handler())
+    fallbacks = remote_zip.stats['fallbacks']
+
+    with remote_zip.open_archive(f'{base_url}/MBTA_GTFS.zip') as archive:
+        assert not isinstance(archive, remote_zip.RemoteZipFile)
+        for name, content in MEMBERS.items():
+            assert archive.read(name).decode() == content
+
+    assert remote_zip.stats['fallbacks'] == fallbacks + 1
+    assert set(server.statuses) == {200}
+
+    # the downloaded archive is cached, opening it again neither falls back nor downloads
+    with remote_zip.open_archive(f'{base_url}/MBTA_GTFS.zip') as archive:
+        assert archive.read('routes.txt').decode() == MEMBERS['routes.txt']
+    assert remote_zip.stats['fallbacks'] == fallbacks + 1
+    assert len(server.statuses) == 2
@@ -0,0 +1,74 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import bigquery_load
+import sinks
+
+
+def read(sink, dataset_id, query):
+    return sqlite3.connect(f'{sink.directory}/{dataset_id}.sqlite').execute(query).fetchall()
+
+
+def test_local_sink_defaults_to_sqlite(tmp_path):
+    sink = sinks.open_sink('project', str(tmp_path))
+
+    assert isinstance(sink, sinks.LocalSink)
+    assert not sink.use_duckdb
+
+
+def test_local_sink_appends_typed_rows(tmp_path):
+    sink = sinks.LocalSink(str(tmp_path), 'project')
+    sink.create_dataset('gtfs')
+    first = pd.DataFrame({'trip_id': ['1'], 'route_id': ['CR-Fairmount'], 'start_date': ['20240901'],
+                          'arrival_time': ['24:10:00'], 'year': [2024], 'season': ['Fall'], 'feed_partition': [20244]})
+    # a later feed brings a column the table does not have yet
+    second = first.assign(trip_id='2', season='Winter', feed_partition=20241, bikes_allowed=[1])
+
+    sink.submit(first, 'gtfs', 'trips', partitioned=True)
+    sink.submit(second, 'gtfs', 'trips', partitioned=True)
+    loaded = sink.wait()
+    sink.close()
+
+    assert [str(table_id) for table_id in loaded] == ['project.gtfs.trips', 'project.gtfs.trips']
+    assert read(sink, 'gtfs', 'SELECT trip_id, start_date, arrival_seconds, bikes_allowed FROM trips ORDER BY trip_id') == \
+        [('1', '2024-09-01', 24 * 3600 + 600, None), ('2', '2024-09-01', 24 * 3600 + 600, 1)]
+    indexes = {name for name, in read(sink, 'gtfs', "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert indexes == {'trips_feed_partition', 'trips_route_id', 'trips_trip_id'}
+
+
+def test_local_sink_deletes_feed_rows(tmp_path):
+    sink = sinks.LocalSink(str(tmp_path), 'project')
+    df = pd.DataFrame({'trip_id': ['1', '2', '3'], 'year': [2023, 2024, 2024], 'season': ['Fall', 'Fall', 'Winter']})
+    sink.submit(df, 'gtfs', 'trips')
+
+    sink.delete_feed_rows('gtfs', 'trips', 2024, 'Fall')
+    assert read(sink, 'gtfs', 'SELECT trip_id FROM trips ORDER BY trip_id') == [('1',), ('3',)]
+    sink.delete_feed_rows('gtfs', 'trips', 2024)
+    assert read(sink, 'gtfs', 'SELECT trip_id FROM trips') == [('1',)]
+    # tables that were never loaded have nothing to delete
+    sink.delete_feed_rows('gtfs', 'stops', 2024)
+    sink.close()
+
+
+def test_local_sink_reports_failed_loads(tmp_path):
+    sink = sinks.LocalSink(str(tmp_path), 'project')
+    sink.submit(pd.DataFrame({'trip_id': ['1']}), 'gtfs', 'trips')
+    # a frame without columns cannot become a table
+    failed = sink.submit(pd.DataFrame(), 'gtfs', 'empty')
+
+    assert failed.exception() is not None
+    with pytest.raises(bigquery_load.LoadError) as error:
+        sink.wait()
+    sink.close()
+
+    assert [str(table_id) for table_id in error.value.loaded] == ['project.gtfs.trips']
+    assert [str(table_id) for table_id, _ in error.value.errors] == ['project.gtfs.empty']
+    assert sink.wait() == []
+
+
+@pytest.mark.skipif(sinks.duckdb is not None, reason='duckdb is installed')
+def test_duckdb_needs_duckdb(tmp_path):
+    with pytest.raises(ImportError):
+        sinks.LocalSink(str(tmp_path), 'project', use_duckdb=True)
@@ -0,0 +1,92 @@
+import pandas as pd
+
+from analysis_scripts import TripCount_TimeOfDay
+from stub_feeds import StubFeeds
+
+WEEKDAY = {day: int(day in TripCount_TimeOfDay.days[:5]) for day in TripCount_TimeOfDay.days}
+SATURDAY = {day: int(day == 'saturday') for day in TripCount_TimeOfDay.days}
+SUNDAY = {day: int(day == 'sunday') for day in TripCount_TimeOfDay.days}
+
+
+def feed(trips, stop_times, services):
+    """
+    Tables of one feed: trips as (trip_id, route_id, service_id), stop times
+    as (trip_id, arrival_time) and services as service_id -> day flags.
+    """
+    stop_times = pd.DataFrame(stop_times, columns=['trip_id', 'arrival_time'])
+    stop_times['departure_time'] = stop_times['arrival_time']
+    stop_times['stop_sequence'] = stop_times.groupby('trip_id').cumcount() + 1
+    calendar = pd.DataFrame([{'service_id': service_id, **flags, 'start_date': '20190101', 'end_date': '20191231'}
+                             for service_id, flags in services.items()])
+    return {
+        'trips': pd.DataFrame(trips, columns=['trip_id', 'route_id', 'service_id']).assign(block_id='b'),
+        'stop_times': TripCount_TimeOfDay.prepare_stop_times(stop_times),
+        'calendar': calendar,
+    }
+
+
+def synthetic_feeds():
+    feeds = {
+        (19, 'Spring'): feed(
+            [('1', 'CR-Fairmount', 'wk'), ('2', 'CR-Lowell', 'sat'), ('3', 'Red', 'wk')],
+            [('1', '06:30:00'), ('1', '07:10:00'), ('1', '25:00:00'), ('2', '13:45:00'), ('3', '08:00:00')],
+            {'wk': WEEKDAY, 'sat': SATURDAY, 'sun': SUNDAY},
+        ),
+        (19, 'Fall'): feed(
+            [('4', 'CR-Fairmount', 'wk'), ('5', 'CR-Fairmount', 'sat')],
+            [('4', '07:30:00'), ('4', '08:59:59'), ('5', '18:30:00')],
+            {'wk': WEEKDAY, 'sat': SATURDAY},
+        ),
+        # no CR-Lowell trips in 2020, and nothing ever runs on Sunday
+        (20, 'Fall'): feed(
+            [('6', 'CR-Fairmount', 'wk')],
+            [('6', '22:00:00'), ('6', 'bad')],
+            {'wk': WEEKDAY},
+        ),
+    }
+    return StubFeeds({(year, season, name): table for (year, season), tables in feeds.items()
+                      for name, table in tables.items()})
+
+
+def old_tripcount_weekday(years, feeds):
+    # the groupby counting of the baseline get_tripcount_weekday, over every season of each year
+    periods = list(dict.fromkeys(label for label, _ in TripCount_TimeOfDay.periods))
+    lines = ['CR-Fairmount', 'CR-Lowell']
+    counts = {}
+    for year in years:
+        merged = TripCount_TimeOfDay.get_mergeddata(year, feeds)
+        for line in lines:
+            line_data = merged[merged['route_id'] == line]
+            for day in TripCount_TimeOfDay.days:
+                day_data = line_data[line_data[day] == 1]
+                counts[(line, 2000 + year, day.capitalize())] = \
+                    day_data.groupby('time_period', observed=True)['trip_id'].count().to_dict()
+    index = pd.MultiIndex.from_tuples(list(counts), names=['Line', 'Year', 'Day'])
+    return pd.DataFrame([counts[key] for key in counts], index=index, columns=periods).fillna(0).astype('int64').sort_index()
+
+
+def test_get_mergeddata_keeps_every_season():
+    merged = TripCount_TimeOfDay.get_mergeddata(19, synthetic_feeds())
+
+    assert sorted(merged['trip_id'].unique()) == ['1', '2', '3', '4', '5']
+    assert len(merged) == 8
+    assert TripCount_TimeOfDay.get_mergeddata(21, synthetic_feeds()).empty
+
+
+def test_tripcount_cube_matches_the_groupby_counts():
+    feeds = synthetic_feeds()
+
+    counts = TripCount_TimeOfDay.get_tripcount_weekday([19, 20], feeds=feeds)
+
+    assert counts.index.names == ['Line', 'Year', 'Day']
+    assert list(counts.columns) == list(dict.fromkeys(label for label, _ in TripCount_TimeOfDay.periods))
+    pd.testing.assert_frame_equal(counts.sort_index(), old_tripcount_weekday([19, 20], feeds), check_dtype=False)
+
+    # lines, years and days without trips are rows of zeros, other routes are left out
+    assert set(counts.index.get_level_values('Line')) == {'CR-Fairmount', 'CR-Lowell'}
+    assert (counts.xs('Sunday', level='Day').to_numpy() == 0).all()
+    assert (counts.loc[('CR-Lowell', 2020)].to_numpy() == 0).all()
+    assert counts.loc[('CR-Fairmount', 2019, 'Monday'), 'AM Peak'] == 3
+    assert counts.loc[('CR-Fairmount', 2019, 'Monday'), 'Night'] == 1
+    assert counts.loc[('CR-Lowell', 2019, 'Saturday'), 'Midday School'] == 1
+    assert counts.to_numpy().sum() == 5 * (5 + 1) + 2
@@ -0,0 +1,28 @@
+import pandas as pd
+
+import gtfs_time
+from analysis_scripts import TripCount_TimeOfDay
+from stub_feeds import StubFeeds
+
+
+def test_trip_histogram_counts_departures_per_feed():
+    stop_times = gtfs_time.parse_time_columns(pd.DataFrame({
+        'trip_id': ['a', 'a', 'b', 'c'],
+        'arrival_time': ['07:00:00', '07:40:00', '07:10:00', '25:05:00'],
+        'departure_time': ['07:01:00', '07:40:00', '07:14:00', '25:05:00'],
+    }))
+    trips = pd.DataFrame({'trip_id': ['a', 'b', 'c'], 'route_id': ['CR-Fairmount'] * 3,
+                          'service_id': ['weekday', 'weekend', 'weekday']})
+    calendar = pd.DataFrame({'service_id': ['weekday', 'weekend'],
+                             **{day: [int(day not in ('saturday', 'sunday')), int(day in ('saturday', 'sunday'))]
+                                for day in TripCount_TimeOfDay.days}})
+    feeds = StubFeeds({(19, 'Fall', 'stop_times'): stop_times, (19, 'Fall', 'trips'): trips,
+                       (19, 'Fall', 'calendar'): calendar})
+
+    histogram = TripCount_TimeOfDay.get_trip_histogram([19], bin_minutes=30, feeds=feeds)
+
+    assert histogram.axes['feed'] == [(19, 'Fall')]
+    assert histogram.axes['route'] == ['CR-Fairmount']
+    weekday = histogram.counts[0, 0, 0]
+    assert weekday[14] == 1 and weekday[50] == 1 and weekday.sum() == 2
+    assert histogram.counts[0, 0, 1].sum() == 1 and histogram.counts[0, 0, 1][14] == 1